@@ -1,6 +1,8 @@
 import os
 from flask import Flask, render_template, redirect, url_for, send_from_directory
-from db import init_db
+from db import init_db, init_app as init_db_app
+from cleanup import start_sweeper
+from metrics import init_app as init_metrics
 from apps.legal.routes import legal_bp
 from apps.gen.routes import gen_bp
 from apps.optimizer.routes import optimizer_bp
@@ -18,6 +20,9 @@ app.register_blueprint(bulk_bp,      url_prefix="/bulk")
 app.register_blueprint(finder_bp,    url_prefix="/finder")
 
 init_db()
+init_db_app(app)
+init_metrics(app)
+start_sweeper()
 
 
 @app.route("/")
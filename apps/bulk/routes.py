@@ -1,15 +1,18 @@
 import os, io, uuid, json, csv
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import (Blueprint, render_template, request, jsonify,
-                   send_file, redirect, url_for, session, Response)
-from groq import Groq
-from db import get_db, get_setting, set_setting
-from cleanup import purge_bulk_files
+                   send_file, redirect, url_for, session, Response, stream_with_context)
+from db import get_db, get_setting, set_setting, list_page, report_page, drop_db
+from llm import get_client, chat_json
+from cleanup import purge_bulk_files, register_sweep
+from metrics import app_summary
 
 bulk_bp = Blueprint("bulk", __name__)
 
 GEN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "generated", "bulk")
 os.makedirs(GEN_DIR, exist_ok=True)
+register_sweep("bulk", purge_bulk_files, GEN_DIR)
 
 ADMIN_PW_KEY = "bulk_admin_pw"
 DEFAULT_PW   = "admin123"
@@ -22,20 +25,34 @@ def now():
 
 def get_groq_client():
     key = get_setting("bulk_settings","groq_api_key")
-    return Groq(api_key=key) if key else None
+    return get_client(key)
 
 
-def generate_batch_metadata(niche, count, extra_notes=""):
-    client = get_groq_client()
-    if not client:
-        return None, "Groq API key not configured. Visit /bulk/julisunkan"
+# Large batches are split into chunks generated concurrently: one 50-book
+# completion is slow and its JSON gets truncated long before the last book.
+BULK_CHUNK_SIZE  = int(os.environ.get("BULK_CHUNK_SIZE", "5"))
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", "4"))
+TOKENS_PER_BOOK  = 1000
+
+
+def chunk_sizes(count, size=None):
+    size = size or BULK_CHUNK_SIZE
+    return [min(size, count - i) for i in range(0, count, size)]
+
+
+def generate_chunk_metadata(client, niche, count, extra_notes="", part=1, parts=1):
+    """Generate one chunk of a batch. Returns (books, error)."""
     system = (
         "You are a KDP publishing expert. Create unique, high-quality book metadata for Amazon KDP. "
         "Each book should be distinct with different angles, titles, and descriptions. "
         "Always respond with valid JSON only, no markdown."
     )
+    # The part number keeps concurrent chunks from being identical prompts
+    # (and identical cache entries), and pushes them toward different angles.
+    part_note = (f"\nThis is part {part} of {parts} of a larger batch in this niche — "
+                 f"choose sub-audiences and angles that other parts are unlikely to use.") if parts > 1 else ""
     prompt = f"""Create metadata for {count} unique KDP books in the "{niche}" niche.
-Extra notes: {extra_notes or "Make each book appeal to a different sub-audience"}
+Extra notes: {extra_notes or "Make each book appeal to a different sub-audience"}{part_note}
 
 Return ONLY a JSON array with exactly {count} book objects:
 [
@@ -54,23 +71,119 @@ Return ONLY a JSON array with exactly {count} book objects:
   }}
 ]"""
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role":"system","content":system},{"role":"user","content":prompt}],
-            max_tokens=6000, temperature=0.7)
-        raw = resp.choices[0].message.content.strip()
-        if raw.startswith("```"):
-            raw = raw.split("```")[1]
-            if raw.startswith("json"): raw = raw[4:]
-        books = json.loads(raw)
-        if not isinstance(books, list): raise ValueError("Expected JSON array")
-        return books[:count], None
+        books = chat_json(client, system, prompt, max_tokens=min(6000, 500 + count * TOKENS_PER_BOOK),
+                          temperature=0.7, expect=list)
+        return [b for b in books if isinstance(b, dict)][:count], None
     except json.JSONDecodeError as e:
         return None, f"AI returned invalid JSON: {e}"
     except Exception as e:
         return None, str(e)
 
 
+def dedupe_books(books, seen=None):
+    """Drop books whose title was already seen (case/whitespace-insensitive)."""
+    seen = set() if seen is None else seen
+    unique = []
+    for b in books:
+        key = " ".join(str(b.get("title", "")).lower().split())
+        if key and key in seen:
+            continue
+        seen.add(key)
+        unique.append(b)
+    return unique
+
+
+def _chunk_task(*args):
+    """generate_chunk_metadata on a pool thread. The pool lives for one
+    request, so close the connection its response-cache lookups opened."""
+    try:
+        return generate_chunk_metadata(*args)
+    finally:
+        drop_db()
+
+
+def iter_batch_metadata(client, niche, count, extra_notes=""):
+    """Yield (books, error) for each chunk as soon as it completes.
+    Books are de-duplicated against earlier chunks and capped at count overall.
+    Closing the generator cancels chunks that have not started yet."""
+    sizes = chunk_sizes(count)
+    pool = ThreadPoolExecutor(max_workers=max(1, min(BULK_CONCURRENCY, len(sizes))))
+    try:
+        futures = [pool.submit(_chunk_task, client, niche, size, extra_notes, i + 1, len(sizes))
+                   for i, size in enumerate(sizes)]
+        seen, produced = set(), 0
+        for future in as_completed(futures):
+            chunk, err = future.result()
+            if err:
+                yield None, err
+                continue
+            chunk = dedupe_books(chunk, seen)[:count - produced]
+            produced += len(chunk)
+            yield chunk, None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_batch_metadata(niche, count, extra_notes=""):
+    """Generate count books in concurrent chunks.
+    Chunks that fail are skipped; an error is returned only if every chunk fails."""
+    client = get_groq_client()
+    if not client:
+        return None, "Groq API key not configured. Visit /bulk/julisunkan"
+    books, errors = [], []
+    for chunk, err in iter_batch_metadata(client, niche, count, extra_notes):
+        if err:
+            errors.append(err)
+        else:
+            books.extend(chunk)
+    if not books:
+        return None, errors[0] if errors else "AI returned no books"
+    return books, None
+
+
+def book_row(batch_id, book):
+    """bulk_books row for a generated book, stored as a draft; sets book["id"]."""
+    book["id"] = str(uuid.uuid4())
+    return (book["id"], batch_id,
+            book.get("title",""),
+            book.get("subtitle",""),
+            book.get("description",""),
+            json.dumps(book.get("keywords",[])),
+            book.get("primary_category",""),
+            book.get("secondary_category",""),
+            book.get("pages",120),
+            book.get("language","English"),
+            "draft",
+            book.get("price_usd"),
+            book.get("target_audience",""),
+            book.get("unique_angle",""))
+
+
+def insert_books(conn, batch_id, books):
+    """Insert generated books with one executemany; the caller commits."""
+    conn.executemany("INSERT INTO bulk_books VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                     [book_row(batch_id, book) for book in books])
+
+
+UPDATE_BOOK_SQL = """UPDATE bulk_books SET title=?,subtitle=?,description=?,keywords=?,
+                     primary_category=?,secondary_category=?,pages=?,language=? WHERE id=?"""
+
+MAX_BOOKS_PER_UPDATE = 200
+
+
+def book_update_params(data, book_id):
+    keywords = data.get("keywords",[])
+    return (data.get("title",""),
+            data.get("subtitle",""),
+            data.get("description",""),
+            json.dumps(keywords) if isinstance(keywords,list) else keywords,
+            data.get("primary_category",""),
+            data.get("secondary_category",""),
+            data.get("pages",120),
+            data.get("language","English"),
+            book_id)
+
+
 def books_to_csv(books):
     buf = io.StringIO()
     fields = ["title","subtitle","description","keywords","primary_category",
@@ -94,20 +207,24 @@ def books_to_csv(books):
 
 @bulk_bp.route("/")
 def index():
-    purge_bulk_files(GEN_DIR)
     conn = get_db()
     batches = conn.execute("SELECT * FROM bulk_batches ORDER BY created_at DESC LIMIT 20").fetchall()
     conn.close()
     return render_template("bulk/index.html", batches=batches, languages=KDP_LANGUAGES)
 
 
-@bulk_bp.route("/generate", methods=["POST"])
-def generate():
-    data  = request.get_json(force=True)
+def parse_batch_request(data):
     niche = data.get("niche","").strip()[:200]
     count = max(1, min(int(data.get("count", 5)), 50))
     name  = data.get("batch_name","").strip()[:100] or f"{niche} Batch"
     extra = data.get("extra_notes","").strip()[:500]
+    return niche, count, name, extra
+
+
+@bulk_bp.route("/generate", methods=["POST"])
+def generate():
+    data  = request.get_json(force=True)
+    niche, count, name, extra = parse_batch_request(data)
     if not niche:
         return jsonify({"error": "Niche is required"}), 400
     books, err = generate_batch_metadata(niche, count, extra)
@@ -116,28 +233,69 @@ def generate():
     batch_id = str(uuid.uuid4())
     conn = get_db()
     conn.execute("INSERT INTO bulk_batches VALUES (?,?,?,?,?,?,?)",
-                 (batch_id, name, niche, count, "done", None, now()))
-    for book in books:
-        book_id = str(uuid.uuid4())
-        conn.execute("INSERT INTO bulk_books VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-                     (book_id, batch_id,
-                      book.get("title",""),
-                      book.get("subtitle",""),
-                      book.get("description",""),
-                      json.dumps(book.get("keywords",[])),
-                      book.get("primary_category",""),
-                      book.get("secondary_category",""),
-                      book.get("pages",120),
-                      book.get("language","English"),
-                      "draft",
-                      book.get("price_usd"),
-                      book.get("target_audience",""),
-                      book.get("unique_angle","")))
+                 (batch_id, name, niche, len(books), "done", None, now()))
+    insert_books(conn, batch_id, books)
     conn.commit()
     conn.close()
     return jsonify({"batch_id": batch_id, "books": books, "count": len(books)})
 
 
+@bulk_bp.route("/generate-stream", methods=["POST"])
+def generate_stream():
+    """Like /generate, but streams NDJSON events and stores each book as it arrives:
+    {"type":"batch"} first, then {"type":"book"} / {"type":"error"} per chunk,
+    then {"type":"done"}. Books already stored survive a client disconnect,
+    which leaves the batch "partial"; a batch whose worker died mid-stream is
+    failed by the cleanup sweep."""
+    data  = request.get_json(force=True)
+    niche, count, name, extra = parse_batch_request(data)
+    if not niche:
+        return jsonify({"error": "Niche is required"}), 400
+    client = get_groq_client()
+    if not client:
+        return jsonify({"error": "Groq API key not configured. Visit /bulk/julisunkan"}), 500
+    batch_id = str(uuid.uuid4())
+    conn = get_db()
+    conn.execute("INSERT INTO bulk_batches VALUES (?,?,?,?,?,?,?)",
+                 (batch_id, name, niche, 0, "running", None, now()))
+    conn.commit()
+    conn.close()
+
+    def line(event):
+        return json.dumps(event) + "\n"
+
+    def events():
+        stored, errors, finished = 0, [], False
+        try:
+            yield line({"type": "batch", "batch_id": batch_id, "count": count})
+            for chunk, err in iter_batch_metadata(client, niche, count, extra):
+                if err:
+                    errors.append(err)
+                    yield line({"type": "error", "error": err})
+                    continue
+                conn = get_db()
+                insert_books(conn, batch_id, chunk)
+                conn.execute("UPDATE bulk_batches SET book_count=book_count+? WHERE id=?", (len(chunk), batch_id))
+                conn.commit()
+                conn.close()
+                stored += len(chunk)
+                for book in chunk:
+                    yield line({"type": "book", "book": book})
+            finished = True
+            yield line({"type": "done", "batch_id": batch_id, "count": stored, "errors": errors})
+        finally:
+            # Runs on completion, and on GeneratorExit when the client goes away.
+            status = ("done" if finished else "partial") if stored else "failed"
+            conn = get_db()
+            conn.execute("UPDATE bulk_batches SET status=?, book_count=? WHERE id=?",
+                         (status, stored, batch_id))
+            conn.commit()
+            conn.close()
+
+    return Response(stream_with_context(events()), mimetype="application/x-ndjson",
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
+
 @bulk_bp.route("/batch/<batch_id>")
 def get_batch(batch_id):
     conn = get_db()
@@ -158,26 +316,44 @@ def get_batch(batch_id):
 def update_book(book_id):
     data = request.get_json(force=True)
     conn = get_db()
-    existing = conn.execute("SELECT id FROM bulk_books WHERE id=?", (book_id,)).fetchone()
-    if not existing:
-        conn.close()
-        return jsonify({"error": "Book not found"}), 404
-    conn.execute("""UPDATE bulk_books SET title=?,subtitle=?,description=?,keywords=?,
-                    primary_category=?,secondary_category=?,pages=?,language=? WHERE id=?""",
-                 (data.get("title",""),
-                  data.get("subtitle",""),
-                  data.get("description",""),
-                  json.dumps(data.get("keywords",[])) if isinstance(data.get("keywords"),list) else data.get("keywords",""),
-                  data.get("primary_category",""),
-                  data.get("secondary_category",""),
-                  data.get("pages",120),
-                  data.get("language","English"),
-                  book_id))
+    updated = conn.execute(UPDATE_BOOK_SQL, book_update_params(data, book_id)).rowcount
     conn.commit()
     conn.close()
+    if not updated:
+        return jsonify({"error": "Book not found"}), 404
     return jsonify({"ok": True})
 
 
+@bulk_bp.route("/update-books", methods=["POST"])
+def update_books():
+    """Save several edited books in one request and one transaction.
+    Body: {"books": [{"id": ..., <fields as for /update-book>}, ...]}.
+    All-or-nothing: if any id is unknown nothing is written."""
+    data  = request.get_json(force=True, silent=True) or {}
+    books = data.get("books")
+    if not isinstance(books, list) or not books:
+        return jsonify({"error": "books must be a non-empty list"}), 400
+    if len(books) > MAX_BOOKS_PER_UPDATE:
+        return jsonify({"error": f"At most {MAX_BOOKS_PER_UPDATE} books per request"}), 400
+    params = {}
+    for book in books:
+        if not isinstance(book, dict) or not book.get("id"):
+            return jsonify({"error": "Every book needs an id"}), 400
+        params[book["id"]] = book_update_params(book, book["id"])   # last edit of an id wins
+    conn = get_db()
+    updated = conn.executemany(UPDATE_BOOK_SQL, list(params.values())).rowcount
+    if updated != len(params):
+        conn.rollback()
+        ids = list(params)
+        found = {r["id"] for r in conn.execute(
+            f"SELECT id FROM bulk_books WHERE id IN ({','.join('?' * len(ids))})", ids).fetchall()}
+        conn.close()
+        return jsonify({"error": "Book not found", "missing": [i for i in ids if i not in found]}), 404
+    conn.commit()
+    conn.close()
+    return jsonify({"ok": True, "updated": updated})
+
+
 @bulk_bp.route("/export-csv/<batch_id>")
 def export_csv(batch_id):
     conn = get_db()
@@ -196,12 +372,17 @@ def export_csv(batch_id):
                      download_name=f"kdp_batch_{batch_id[:8]}.csv")
 
 
+BATCH_FIELDS = ("id", "name", "niche", "book_count", "status", "out_file", "created_at")
+
+
 @bulk_bp.route("/batches")
 def get_batches():
     conn = get_db()
-    rows = conn.execute("SELECT * FROM bulk_batches ORDER BY created_at DESC LIMIT 30").fetchall()
+    page, err = list_page(conn, request.args, "bulk_batches", BATCH_FIELDS)
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 # ── Admin ────────────────────────────────────────────────────────
@@ -217,15 +398,15 @@ def admin():
             return render_template("bulk/admin.html", error="Wrong password", logged_in=False)
         return render_template("bulk/admin.html", logged_in=False, error=None)
     conn = get_db()
-    stats = {
-        "batches": conn.execute("SELECT COUNT(*) FROM bulk_batches").fetchone()[0],
-        "books":   conn.execute("SELECT COUNT(*) FROM bulk_books").fetchone()[0],
-    }
+    stats = dict(conn.execute("""SELECT
+        (SELECT COUNT(*) FROM bulk_batches) AS batches,
+        (SELECT COUNT(*) FROM bulk_books) AS books""").fetchone())
     conn.close()
     settings = {"groq_api_key": get_setting("bulk_settings","groq_api_key"),
                 "admin_password": get_setting("bulk_settings", ADMIN_PW_KEY) or DEFAULT_PW,
                 "default_pages": get_setting("bulk_settings","default_pages") or "120"}
-    return render_template("bulk/admin.html", logged_in=True, settings=settings, stats=stats, error=None)
+    return render_template("bulk/admin.html", logged_in=True, settings=settings, stats=stats,
+                           perf=app_summary("bulk"), error=None)
 
 
 @bulk_bp.route("/julisunkan/save", methods=["POST"])
@@ -248,8 +429,8 @@ def admin_logout():
 def admin_purge_expired():
     if not session.get("bulk_admin"):
         return jsonify({"error": "Unauthorized"}), 401
-    purge_bulk_files(GEN_DIR)
-    return jsonify({"ok": True})
+    result = purge_bulk_files(GEN_DIR)
+    return jsonify({"ok": True, **result})
 
 
 # ── User Reports ─────────────────────────────────────────────────
@@ -275,9 +456,11 @@ def admin_reports():
     if not session.get("bulk_admin"):
         return jsonify({"error": "Unauthorized"}), 401
     conn = get_db()
-    rows = conn.execute("SELECT * FROM bulk_reports ORDER BY created_at DESC").fetchall()
+    page, err = report_page(conn, request.args, "bulk_reports")
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 @bulk_bp.route("/julisunkan/reports/<report_id>/review", methods=["POST"])
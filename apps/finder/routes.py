@@ -1,15 +1,17 @@
 import os, io, uuid, json, csv
 from datetime import datetime
 from flask import (Blueprint, render_template, request, jsonify,
-                   send_file, redirect, url_for, session, Response)
-from groq import Groq
-from db import get_db, get_setting, set_setting
-from cleanup import purge_finder_files
+                   send_file, redirect, url_for, session, Response, stream_with_context)
+from db import get_db, get_setting, set_setting, list_page, report_page
+from llm import get_client, chat_json, stream_json, sse
+from cleanup import purge_finder_files, register_sweep
+from metrics import app_summary
 
 finder_bp = Blueprint("finder", __name__)
 
 GEN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "generated", "finder")
 os.makedirs(GEN_DIR, exist_ok=True)
+register_sweep("finder", purge_finder_files, GEN_DIR)
 
 ADMIN_PW_KEY = "finder_admin_pw"
 DEFAULT_PW   = "admin123"
@@ -20,13 +22,10 @@ def now():
 
 def get_groq_client():
     key = get_setting("finder_settings","groq_api_key")
-    return Groq(api_key=key) if key else None
+    return get_client(key)
 
 
-def find_niches(topic, search_type="full"):
-    client = get_groq_client()
-    if not client:
-        return None, "Groq API key not configured. Visit /finder/julisunkan"
+def build_niche_prompt(topic):
     system = (
         "You are a KDP market research expert with deep knowledge of Amazon publishing niches. "
         "Analyze markets and provide data-driven insights for KDP publishers. "
@@ -71,17 +70,16 @@ Return ONLY this JSON structure:
   "seasonal_trends": "insights about seasonal demand patterns"
 }}
 Include 5-8 niches and 15-20 keywords."""
+    return system, prompt
+
 
+def find_niches(topic, search_type="full"):
+    client = get_groq_client()
+    if not client:
+        return None, "Groq API key not configured. Visit /finder/julisunkan"
+    system, prompt = build_niche_prompt(topic)
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role":"system","content":system},{"role":"user","content":prompt}],
-            max_tokens=5000, temperature=0.4)
-        raw = resp.choices[0].message.content.strip()
-        if raw.startswith("```"):
-            raw = raw.split("```")[1]
-            if raw.startswith("json"): raw = raw[4:]
-        return json.loads(raw), None
+        return chat_json(client, system, prompt, max_tokens=5000, temperature=0.4), None
     except json.JSONDecodeError as e:
         return None, f"AI returned invalid JSON: {e}"
     except Exception as e:
@@ -118,13 +116,22 @@ def results_to_csv(results, topic):
 
 @finder_bp.route("/")
 def index():
-    purge_finder_files(GEN_DIR)
     conn = get_db()
     recent = conn.execute("SELECT id,seed_topic,created_at FROM finder_searches ORDER BY created_at DESC LIMIT 10").fetchall()
     conn.close()
     return render_template("finder/index.html", recent=recent)
 
 
+def save_search(topic, results):
+    search_id = str(uuid.uuid4())
+    conn = get_db()
+    conn.execute("INSERT INTO finder_searches VALUES (?,?,?,?)",
+                 (search_id, topic, json.dumps(results), now()))
+    conn.commit()
+    conn.close()
+    return search_id
+
+
 @finder_bp.route("/search", methods=["POST"])
 def search():
     data  = request.get_json(force=True)
@@ -134,15 +141,41 @@ def search():
     results, err = find_niches(topic)
     if err:
         return jsonify({"error": err}), 500
-    search_id = str(uuid.uuid4())
-    conn = get_db()
-    conn.execute("INSERT INTO finder_searches VALUES (?,?,?,?)",
-                 (search_id, topic, json.dumps(results), now()))
-    conn.commit()
-    conn.close()
+    search_id = save_search(topic, results)
     return jsonify({"search_id": search_id, "results": results})
 
 
+@finder_bp.route("/search-stream", methods=["POST"])
+def search_stream():
+    """Server-sent events: an "item" event per niche / keyword / quick win as the
+    model finishes it, then "result" with the saved search, or "error"."""
+    data  = request.get_json(force=True)
+    topic = data.get("topic","").strip()[:200]
+    if not topic:
+        return jsonify({"error": "Search topic is required"}), 400
+    client = get_groq_client()
+    if not client:
+        return jsonify({"error": "Groq API key not configured. Visit /finder/julisunkan"}), 500
+    system, prompt = build_niche_prompt(topic)
+
+    def events():
+        try:
+            for kind, key, value in stream_json(client, system, prompt, max_tokens=5000, temperature=0.4,
+                                                watch=("niches", "top_keywords", "quick_wins", "books_to_avoid")):
+                if kind == "item":
+                    yield sse("item", {"key": key, "value": value})
+                else:
+                    search_id = save_search(topic, value)
+                    yield sse("result", {"search_id": search_id, "results": value})
+        except json.JSONDecodeError as e:
+            yield sse("error", {"error": f"AI returned invalid JSON: {e}"})
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
+
 @finder_bp.route("/result/<search_id>")
 def get_result(search_id):
     conn = get_db()
@@ -165,12 +198,19 @@ def export(search_id):
                      download_name=f"kdp_research_{search_id[:8]}.csv")
 
 
+# results is the full research JSON; ask for it explicitly with ?fields=.
+HISTORY_FIELDS = ("id", "seed_topic", "results", "created_at")
+
+
 @finder_bp.route("/history")
 def history():
     conn = get_db()
-    rows = conn.execute("SELECT id,seed_topic,created_at FROM finder_searches ORDER BY created_at DESC LIMIT 30").fetchall()
+    page, err = list_page(conn, request.args, "finder_searches", HISTORY_FIELDS,
+                          default_fields=("id", "seed_topic", "created_at"))
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 # ── Admin ────────────────────────────────────────────────────────
@@ -190,7 +230,8 @@ def admin():
     conn.close()
     settings = {"groq_api_key": get_setting("finder_settings","groq_api_key"),
                 "admin_password": get_setting("finder_settings", ADMIN_PW_KEY) or DEFAULT_PW}
-    return render_template("finder/admin.html", logged_in=True, settings=settings, stats=stats, error=None)
+    return render_template("finder/admin.html", logged_in=True, settings=settings, stats=stats,
+                           perf=app_summary("finder"), error=None)
 
 
 @finder_bp.route("/julisunkan/save", methods=["POST"])
@@ -213,8 +254,8 @@ def admin_logout():
 def admin_purge_expired():
     if not session.get("finder_admin"):
         return jsonify({"error": "Unauthorized"}), 401
-    purge_finder_files(GEN_DIR)
-    return jsonify({"ok": True})
+    result = purge_finder_files(GEN_DIR)
+    return jsonify({"ok": True, **result})
 
 
 # ── User Reports ─────────────────────────────────────────────────
@@ -240,9 +281,11 @@ def admin_reports():
     if not session.get("finder_admin"):
         return jsonify({"error": "Unauthorized"}), 401
     conn = get_db()
-    rows = conn.execute("SELECT * FROM finder_reports ORDER BY created_at DESC").fetchall()
+    page, err = report_page(conn, request.args, "finder_reports")
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 @finder_bp.route("/julisunkan/reports/<report_id>/review", methods=["POST"])
@@ -0,0 +1,90 @@
+"""
+Content-addressed cache of rendered gen-app PDFs.
+Artifacts live in generated/gen/cache/<sha256>.pdf and are hard-linked into
+each project's own <proj_id>.pdf, so purge_gen_files can keep deleting project
+files by TTL without touching the cache, and evicting a cache entry never
+breaks an existing download. The cache is bounded by CACHE_MAX_BYTES with
+least-recently-used eviction (mtime is refreshed on every hit).
+"""
+import os, json, shutil, hashlib, uuid
+
+# Bump whenever draw_interior / generate_cover_pdf output changes.
+RENDERER_VERSION = "2"
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "generated", "gen", "cache")
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+CACHE_MAX_BYTES = int(os.environ.get("GEN_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+
+def cache_key(kind, inputs):
+    """Hash of the normalized render inputs plus the renderer version."""
+    payload = json.dumps({"kind": kind, "renderer": RENDERER_VERSION, "inputs": inputs},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.pdf")
+
+
+def _link_or_copy(src, dest):
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def fetch_cached(key, dest):
+    """Materialize a cached artifact at dest. Returns True on a cache hit."""
+    src = _cache_path(key)
+    try:
+        _link_or_copy(src, dest)
+    except FileNotFoundError:
+        return False
+    try:
+        os.utime(src)
+    except OSError:
+        pass
+    return True
+
+
+def store_cached(key, src):
+    """Add a freshly rendered file to the cache, then enforce the size bound."""
+    tmp = os.path.join(CACHE_DIR, f".{key}.{uuid.uuid4().hex}.tmp")
+    try:
+        _link_or_copy(src, tmp)
+        os.replace(tmp, _cache_path(key))
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return
+    evict_cached()
+
+
+def evict_cached(max_bytes=None):
+    """Remove least-recently-used artifacts until the cache fits in max_bytes."""
+    limit = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    try:
+        with os.scandir(CACHE_DIR) as it:
+            for e in it:
+                if e.name.endswith(".pdf") and e.is_file():
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+    except OSError:
+        return 0
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -1,15 +1,23 @@
-import os, io, uuid, json
+import os, io, uuid, json, hashlib
 from datetime import datetime
 from flask import (Blueprint, render_template, request, jsonify,
                    send_file, redirect, url_for, session, Response)
-from groq import Groq
-from db import get_db, get_setting, set_setting
-from cleanup import purge_gen_files
+from db import get_db, get_setting, set_setting, list_page, report_page
+from llm import get_client
+from cleanup import purge_gen_files, register_sweep, track_file
+from metrics import timed, span, app_summary
+from apps.gen.cache import cache_key, fetch_cached, store_cached
+from jobs import submit as submit_job
 
 gen_bp = Blueprint("gen", __name__)
 
 GEN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "generated", "gen")
 os.makedirs(GEN_DIR, exist_ok=True)
+# In-progress renders; same filesystem as GEN_DIR so finished files can be
+# renamed into place atomically, and a subdirectory so orphan purges skip it.
+TMP_DIR = os.path.join(GEN_DIR, "tmp")
+os.makedirs(TMP_DIR, exist_ok=True)
+register_sweep("gen", purge_gen_files, GEN_DIR)
 
 ADMIN_PW_KEY = "gen_admin_pw"
 DEFAULT_PW   = "admin123"
@@ -65,9 +73,10 @@ def now():
 
 def get_groq():
     key = get_setting("gen_settings", "groq_api_key")
-    return Groq(api_key=key) if key else None
+    return get_client(key)
 
 
+@timed("gen.draw_interior")
 def draw_interior(tpl_id, page_w, page_h, c, margin=36):
     """Draw one page of interior content using reportlab canvas."""
     from reportlab.lib.colors import HexColor
@@ -382,16 +391,41 @@ def draw_interior(tpl_id, page_w, page_h, c, margin=36):
             y += spacing
 
 
-def generate_interior_pdf(tpl_id, page_count, paper_size):
+def interior_form_name(tpl_id, paper_size, margin=36):
+    """Name of the Form XObject holding one (template, paper size, margin) page.
+    A hash of the inputs, so the name is a valid PDF name whatever they hold."""
+    digest = hashlib.sha1(f"{tpl_id}|{paper_size}|{margin}".encode("utf-8")).hexdigest()[:16]
+    return f"interior_{digest}"
+
+
+@timed("gen.generate_interior_pdf")
+def generate_interior_pdf(tpl_id, page_count, paper_size, reuse_template=True, out=None):
+    """Render an interior PDF to out (a path or file object).
+    Without out, a rewound BytesIO holding the PDF is returned.
+
+    Interior pages are identical, so by default the page is drawn once as a
+    Form XObject and stamped onto every page; reuse_template=False falls back
+    to redrawing each page with draw_interior.
+    """
     from reportlab.pdfgen import canvas as rc
     pw, ph = PAPER_SIZES.get(paper_size, PAPER_SIZES["6x9"])
-    buf = io.BytesIO()
+    buf = io.BytesIO() if out is None else out
     c = rc.Canvas(buf, pagesize=(pw, ph))
-    for _ in range(page_count):
+    form = None
+    if reuse_template:
+        form = interior_form_name(tpl_id, paper_size)
+        c.beginForm(form)
         draw_interior(tpl_id, pw, ph, c)
+        c.endForm()
+    for _ in range(page_count):
+        if form:
+            c.doForm(form)
+        else:
+            draw_interior(tpl_id, pw, ph, c)
         c.showPage()
     c.save()
-    buf.seek(0)
+    if out is None:
+        buf.seek(0)
     return buf
 
 
@@ -409,13 +443,13 @@ COVER_SCHEMES = {
 }
 
 
-def generate_cover_pdf(title, subtitle, author, cover_tpl, prompt):
+def generate_cover_pdf(title, subtitle, author, cover_tpl, prompt, out=None):
     from reportlab.pdfgen import canvas as rc
     from reportlab.lib.colors import HexColor
     # KDP full cover: front + spine + back (approx 6x9, 130 pages, no bleed for simplicity)
     # Front cover only for simplicity: 6x9 at 300dpi → 1800x2700px, but PDF points 432x648
     pw, ph = 432, 648
-    buf = io.BytesIO()
+    buf = io.BytesIO() if out is None else out
     c = rc.Canvas(buf, pagesize=(pw, ph))
     scheme = COVER_SCHEMES.get(cover_tpl, COVER_SCHEMES["minimal"])
     bg_c  = HexColor(scheme["bg"])
@@ -469,15 +503,111 @@ def generate_cover_pdf(title, subtitle, author, cover_tpl, prompt):
     c.line(40, ph*0.42, pw-40, ph*0.42)
 
     c.save()
-    buf.seek(0)
+    if out is None:
+        buf.seek(0)
     return buf
 
 
+def interior_cache_key(tpl_id, page_count, paper_size):
+    paper_size = paper_size if paper_size in PAPER_SIZES else "6x9"
+    return cache_key("interior", {"template_id": tpl_id, "page_count": page_count,
+                                  "paper_size": paper_size})
+
+
+def cover_cache_key(title, subtitle, author, cover_tpl):
+    # Only the inputs generate_cover_pdf actually draws; the prompt is not rendered.
+    cover_tpl = cover_tpl if cover_tpl in COVER_SCHEMES else "minimal"
+    return cache_key("cover", {"title": title, "subtitle": (subtitle or "")[:50],
+                               "author": author or "", "template_id": cover_tpl,
+                               "scheme": COVER_SCHEMES[cover_tpl]})
+
+
+def render_to_file(ptype, tpl_id, page_count, paper_size, title, subtitle, author, prompt, out_path):
+    """Render an interior or cover to out_path, reusing the artifact cache."""
+    if ptype == "interior":
+        key = interior_cache_key(tpl_id, page_count, paper_size)
+    else:
+        key = cover_cache_key(title, subtitle, author, tpl_id)
+
+    if not fetch_cached(key, out_path):
+        # reportlab writes straight to the temp file; the rename means readers
+        # never see a half-written PDF at out_path.
+        tmp_path = os.path.join(TMP_DIR, f"{uuid.uuid4()}.pdf")
+        try:
+            if ptype == "interior":
+                generate_interior_pdf(tpl_id, page_count, paper_size, out=tmp_path)
+            else:
+                generate_cover_pdf(title, subtitle, author, tpl_id, prompt, out=tmp_path)
+            os.replace(tmp_path, out_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        store_cached(key, out_path)
+    track_file(out_path)
+
+
+def set_project_status(proj_id, status):
+    """Move a project to status. A failed project stays failed (e.g. one the
+    sweeper gave up on whose job turns up late). Returns whether it moved."""
+    conn = get_db()
+    cur = conn.execute("UPDATE gen_projects SET status=?, status_updated_at=? WHERE id=? AND status != 'failed'",
+                       (status, now(), proj_id))
+    conn.commit()
+    conn.close()
+    return cur.rowcount > 0
+
+
+def insert_project(proj_id, params, out_name, status):
+    ptype, tpl_id, page_count, paper_size, title, subtitle, author, prompt = params
+    ts = now()
+    conn = get_db()
+    conn.execute("""INSERT INTO gen_projects (id, title, project_type, template_id, prompt, page_count,
+                    paper_size, out_file, status, created_at, status_updated_at) VALUES (?,?,?,?,?,?,?,?,?,?,?)""",
+                 (proj_id, title, ptype, tpl_id, prompt, page_count, paper_size, out_name, status, ts, ts))
+    conn.commit()
+    conn.close()
+
+
+def run_project_job(proj_id, ptype, tpl_id, page_count, paper_size, title, subtitle, author, prompt):
+    """Job-pool entry point: render one queued project and record its status."""
+    if not set_project_status(proj_id, "running"):
+        return
+    try:
+        render_to_file(ptype, tpl_id, page_count, paper_size, title, subtitle, author, prompt,
+                       os.path.join(GEN_DIR, f"{proj_id}.pdf"))
+    except Exception:
+        set_project_status(proj_id, "failed")
+        raise
+    set_project_status(proj_id, "done")
+
+
+INTERIOR_IDS = {t["id"] for t in INTERIOR_TEMPLATES}
+COVER_IDS    = {t["id"] for t in COVER_TEMPLATES}
+
+
+def parse_generate_request(data):
+    """Render parameters from a generate request. Returns (params, err)."""
+    ptype      = data.get("type", "interior")
+    tpl_id     = data.get("template_id", "wide_lined")
+    paper_size = data.get("paper_size", "6x9")
+    page_count = max(1, min(int(data.get("page_count", 120)), 500))
+    title      = data.get("title", "My Book")[:100]
+    subtitle   = data.get("subtitle", "")[:80]
+    author     = data.get("author", "")[:60]
+    prompt     = data.get("prompt", "")[:500]
+    if ptype not in ("interior", "cover"):
+        return None, f"Unknown type: {ptype}"
+    if tpl_id not in (INTERIOR_IDS if ptype == "interior" else COVER_IDS):
+        return None, f"Unknown template: {tpl_id}"
+    if paper_size not in PAPER_SIZES:
+        return None, f"Unknown paper size: {paper_size}"
+    return (ptype, tpl_id, page_count, paper_size, title, subtitle, author, prompt), None
+
+
 # ── Routes ───────────────────────────────────────────────────────
 
 @gen_bp.route("/")
 def index():
-    purge_gen_files(GEN_DIR)
     return render_template("gen/index.html",
                            interior_templates=INTERIOR_TEMPLATES,
                            cover_templates=COVER_TEMPLATES,
@@ -487,36 +617,53 @@ def index():
 @gen_bp.route("/generate", methods=["POST"])
 def generate():
     data = request.get_json(force=True)
-    ptype      = data.get("type", "interior")
-    tpl_id     = data.get("template_id", "wide_lined")
-    paper_size = data.get("paper_size", "6x9")
-    page_count = max(1, min(int(data.get("page_count", 120)), 500))
-    title      = data.get("title", "My Book")[:100]
-    subtitle   = data.get("subtitle", "")[:80]
-    author     = data.get("author", "")[:60]
-    prompt     = data.get("prompt", "")[:500]
+    params, err = parse_generate_request(data)
+    if err:
+        return jsonify({"error": err}), 400
 
     proj_id  = str(uuid.uuid4())
     out_name = f"{proj_id}.pdf"
     out_path = os.path.join(GEN_DIR, out_name)
 
     try:
-        if ptype == "interior":
-            buf = generate_interior_pdf(tpl_id, page_count, paper_size)
-        else:
-            buf = generate_cover_pdf(title, subtitle, author, tpl_id, prompt)
+        render_to_file(*params, out_path)
+        insert_project(proj_id, params, out_name, "done")
+        return jsonify({"project_id": proj_id, "filename": out_name})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        with open(out_path, "wb") as f:
-            f.write(buf.read())
 
-        conn = get_db()
-        conn.execute("INSERT INTO gen_projects VALUES (?,?,?,?,?,?,?,?,?,?)",
-                     (proj_id, title, ptype, tpl_id, prompt, page_count, paper_size, out_name, "done", now()))
-        conn.commit()
-        conn.close()
-        return jsonify({"project_id": proj_id, "filename": out_name})
+@gen_bp.route("/jobs", methods=["POST"])
+def submit_generate_job():
+    data = request.get_json(force=True)
+    params, err = parse_generate_request(data)
+    if err:
+        return jsonify({"error": err}), 400
+
+    proj_id  = str(uuid.uuid4())
+    out_name = f"{proj_id}.pdf"
+
+    insert_project(proj_id, params, out_name, "pending")
+    try:
+        submit_job(run_project_job, proj_id, *params,
+                   on_error=lambda e: set_project_status(proj_id, "failed"))
     except Exception as e:
+        set_project_status(proj_id, "failed")
         return jsonify({"error": str(e)}), 500
+    return jsonify({"project_id": proj_id, "status": "pending"}), 202
+
+
+@gen_bp.route("/jobs/<proj_id>")
+def job_status(proj_id):
+    conn = get_db()
+    row = conn.execute("SELECT id, status, out_file FROM gen_projects WHERE id=?", (proj_id,)).fetchone()
+    conn.close()
+    if not row:
+        return jsonify({"error": "Not found"}), 404
+    result = {"project_id": row["id"], "status": row["status"]}
+    if row["status"] == "done":
+        result["filename"] = row["out_file"]
+    return jsonify(result)
 
 
 @gen_bp.route("/enhance-prompt", methods=["POST"])
@@ -533,10 +680,11 @@ Suggest improvements and return a JSON object:
 {{"enhanced_prompt": "improved description", "suggested_title": "great title", "suggested_subtitle": "subtitle", "target_audience": "description", "tips": ["tip1","tip2","tip3"]}}
 Return ONLY valid JSON."""
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role":"system","content":system},{"role":"user","content":user_msg}],
-            max_tokens=1024, temperature=0.7)
+        with span("llm.chat"):
+            resp = client.chat.completions.create(
+                model="llama-3.3-70b-versatile",
+                messages=[{"role":"system","content":system},{"role":"user","content":user_msg}],
+                max_tokens=1024, temperature=0.7)
         raw = resp.choices[0].message.content.strip()
         if raw.startswith("```"):
             raw = raw.split("```")[1]
@@ -554,6 +702,8 @@ def download(proj_id):
     conn.close()
     if not row:
         return jsonify({"error": "Not found"}), 404
+    if row["status"] != "done":
+        return jsonify({"error": "Not ready", "status": row["status"]}), 409
     path = os.path.join(GEN_DIR, row["out_file"])
     if not os.path.exists(path):
         return jsonify({"error": "File not found"}), 404
@@ -562,12 +712,18 @@ def download(proj_id):
                      as_attachment=True, download_name=f"kdp_{label}_{proj_id[:8]}.pdf")
 
 
+HISTORY_FIELDS = ("id", "title", "project_type", "template_id", "prompt",
+                  "page_count", "paper_size", "out_file", "status", "created_at")
+
+
 @gen_bp.route("/history")
 def history():
     conn = get_db()
-    rows = conn.execute("SELECT * FROM gen_projects ORDER BY created_at DESC LIMIT 30").fetchall()
+    page, err = list_page(conn, request.args, "gen_projects", HISTORY_FIELDS)
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 # ── Admin ────────────────────────────────────────────────────────
@@ -588,13 +744,14 @@ def admin():
         "admin_password": get_setting("gen_settings", ADMIN_PW_KEY) or DEFAULT_PW,
     }
     conn = get_db()
-    stats = {
-        "total": conn.execute("SELECT COUNT(*) FROM gen_projects").fetchone()[0],
-        "interiors": conn.execute("SELECT COUNT(*) FROM gen_projects WHERE project_type='interior'").fetchone()[0],
-        "covers": conn.execute("SELECT COUNT(*) FROM gen_projects WHERE project_type='cover'").fetchone()[0],
-    }
+    row = conn.execute("""SELECT COUNT(*) AS total,
+                                 COALESCE(SUM(project_type='interior'), 0) AS interiors,
+                                 COALESCE(SUM(project_type='cover'), 0) AS covers
+                          FROM gen_projects""").fetchone()
+    stats = dict(row)
     conn.close()
-    return render_template("gen/admin.html", logged_in=True, settings=settings, stats=stats, error=None)
+    return render_template("gen/admin.html", logged_in=True, settings=settings, stats=stats,
+                           perf=app_summary("gen"), error=None)
 
 
 @gen_bp.route("/julisunkan/save", methods=["POST"])
@@ -617,8 +774,8 @@ def admin_logout():
 def admin_purge_expired():
     if not session.get("gen_admin"):
         return jsonify({"error": "Unauthorized"}), 401
-    purge_gen_files(GEN_DIR)
-    return jsonify({"ok": True})
+    result = purge_gen_files(GEN_DIR)
+    return jsonify({"ok": True, **result})
 
 
 # ── User Reports ─────────────────────────────────────────────────
@@ -644,9 +801,11 @@ def admin_reports():
     if not session.get("gen_admin"):
         return jsonify({"error": "Unauthorized"}), 401
     conn = get_db()
-    rows = conn.execute("SELECT * FROM gen_reports ORDER BY created_at DESC").fetchall()
+    page, err = report_page(conn, request.args, "gen_reports")
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 @gen_bp.route("/julisunkan/reports/<report_id>/review", methods=["POST"])
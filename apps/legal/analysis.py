@@ -0,0 +1,207 @@
+"""
+Clause-risk analysis of extracted legal text.
+Documents that fit in one chunk are analysed with a single model call. Longer
+ones are analysed map-reduce style: the text is split on section / clause
+boundaries into token-budgeted chunks, every chunk is analysed concurrently
+(under a process-wide rate limit), and the flagged clauses are merged,
+de-duplicated and re-ranked into the usual legal_analyses shape.
+
+Wall time is about ceil(parts / CONCURRENCY) model calls, plus the rate
+limiter once its burst of CONCURRENCY calls is spent: each further part
+waits 60 / CALLS_PER_MINUTE seconds for a token. At the defaults (30 RPM,
+Groq's free tier for this model) a 240k-character document is 20 parts,
+about 32s of limiter wait alone, so synchronous requests only take up to
+SYNC_MAX_PARTS parts (one burst, ≈ one model call) and longer documents
+go through the async pipeline. Raise LEGAL_MAP_RPM on a paid tier.
+"""
+import os, re, json
+from concurrent.futures import ThreadPoolExecutor
+
+from db import drop_db
+from llm import chat_json, RateLimiter
+
+# "mapreduce" covers the whole document (up to MAX_CHARS); "truncate" keeps
+# the old behaviour of analysing only the first chunk.
+ANALYSIS_MODE = os.environ.get("LEGAL_ANALYSIS_MODE", "mapreduce")
+CHUNK_TOKENS  = int(os.environ.get("LEGAL_CHUNK_TOKENS", "3000"))
+CHUNK_CHARS   = CHUNK_TOKENS * 4          # ~4 characters per token of English
+MAX_CHARS     = int(os.environ.get("LEGAL_MAX_CHARS", "240000"))
+CONCURRENCY   = int(os.environ.get("LEGAL_MAP_CONCURRENCY", "4"))
+CALLS_PER_MINUTE = float(os.environ.get("LEGAL_MAP_RPM", "30"))
+# Most parts a synchronous /legal/analyze request analyses itself.
+SYNC_MAX_PARTS = int(os.environ.get("LEGAL_SYNC_MAX_PARTS", str(CONCURRENCY)))
+
+RISK_ORDER = {"HIGH": 0, "MEDIUM": 1, "LOW": 2}
+
+_limiter = RateLimiter(CALLS_PER_MINUTE, burst=CONCURRENCY)
+
+SYSTEM = (
+    "You are an expert legal analyst specializing in contract law and risk assessment. "
+    "Analyze legal documents and identify dangerous, unfair, or risky clauses. "
+    "Always respond with valid JSON only, no markdown, no extra text."
+)
+
+
+def text_budget():
+    """Characters of document text the analysis will use."""
+    return MAX_CHARS if ANALYSIS_MODE == "mapreduce" else CHUNK_CHARS
+
+
+def build_prompt(text, part=1, parts=1):
+    heading = "DOCUMENT:" if parts == 1 else f"DOCUMENT (part {part} of {parts} — assess only this part):"
+    return f"""Analyze the following legal document and identify all risky, dangerous, or potentially harmful clauses.
+
+{heading}
+{text}
+
+Return ONLY this exact JSON structure:
+{{
+  "overall_risk": "HIGH or MEDIUM or LOW",
+  "summary": "2-3 sentence overall assessment",
+  "total_clauses_flagged": 0,
+  "clauses": [
+    {{
+      "clause_text": "exact problematic text excerpt (max 200 chars)",
+      "risk_level": "HIGH or MEDIUM or LOW",
+      "risk_type": "category like Liability, Termination, Penalty, IP Rights, Non-Compete, Arbitration, etc.",
+      "explanation": "detailed explanation of why this is risky",
+      "recommendation": "specific actionable recommendation"
+    }}
+  ]
+}}"""
+
+
+# ── Chunking ────────────────────────────────────────────────────
+
+# A new line that starts a heading or numbered clause: "ARTICLE IV",
+# "Section 12", "4.2 ", "7) ", "(b) " or an ALL-CAPS heading line.
+_BOUNDARY = re.compile(r"""\n(?=[ \t]*(?:
+      (?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule)[ \t]+[0-9IVXLC]+
+    | \d{1,3}(?:\.\d{1,3})*[.)][ \t]+\S
+    | \([a-z0-9]{1,4}\)[ \t]+\S
+    | [A-Z][A-Z0-9 ,&'\-]{3,80}\n
+))""", re.X)
+
+
+def _split_oversized(section, max_chars):
+    """Split one section that is longer than a chunk on paragraph, then
+    sentence boundaries, hard-cutting only as a last resort."""
+    pieces = []
+    while len(section) > max_chars:
+        window = section[:max_chars]
+        cut = max(window.rfind("\n\n"), window.rfind(". "), window.rfind("\n"))
+        if cut < max_chars // 2:
+            cut = max_chars - 1
+        pieces.append(section[:cut + 1])
+        section = section[cut + 1:]
+    pieces.append(section)
+    return pieces
+
+
+def split_sections(text, max_chars=None):
+    """Pack the text's sections into chunks of at most max_chars characters."""
+    max_chars = max_chars or CHUNK_CHARS
+    chunks, current = [], ""
+    for section in _BOUNDARY.split(text):
+        for piece in _split_oversized(section, max_chars):
+            if current and len(current) + len(piece) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return [c for c in chunks if c.strip()]
+
+
+# ── Map / reduce ────────────────────────────────────────────────
+
+def _analyze_chunk(client, text, part, parts):
+    return chat_json(client, SYSTEM, build_prompt(text, part, parts),
+                     max_tokens=4096, temperature=0.2, limiter=_limiter)
+
+
+def _chunk_task(client, text, part, parts):
+    """_analyze_chunk on a map thread. The pool lives for one analysis, so
+    close the connection its response-cache lookups opened."""
+    try:
+        return _analyze_chunk(client, text, part, parts)
+    finally:
+        drop_db()
+
+
+def _clause_key(clause):
+    words = re.sub(r"[^a-z0-9]+", " ", str(clause.get("clause_text", "")).lower()).split()
+    return " ".join(words[:16])
+
+
+def merge_analyses(results):
+    """Reduce per-chunk results (in document order) into one analysis.
+    Clauses flagged in more than one chunk (e.g. a clause straddling a chunk
+    boundary) are kept once, at their highest risk level; the merged list is
+    ranked by risk, then by position in the document."""
+    ranked = {}
+    for part, result in enumerate(results):
+        for pos, clause in enumerate(result.get("clauses") or []):
+            if not isinstance(clause, dict):
+                continue
+            level = str(clause.get("risk_level", "MEDIUM")).upper()
+            clause["risk_level"] = level if level in RISK_ORDER else "MEDIUM"
+            key = _clause_key(clause) or f"{part}:{pos}"
+            rank = (RISK_ORDER[clause["risk_level"]], part, pos)
+            if key not in ranked or rank < ranked[key][0]:
+                ranked[key] = (rank, clause)
+    clauses = [c for _, c in sorted(ranked.values(), key=lambda rc: rc[0])]
+
+    overall = min((str(r.get("overall_risk", "")).upper() for r in results),
+                  key=lambda level: RISK_ORDER.get(level, 3), default="UNKNOWN")
+    if clauses and RISK_ORDER.get(clauses[0]["risk_level"], 3) < RISK_ORDER.get(overall, 3):
+        overall = clauses[0]["risk_level"]
+    if overall not in RISK_ORDER:
+        overall = "UNKNOWN"
+
+    # Lead with the assessment of the riskiest part, then say what was covered.
+    lead = min(results, key=lambda r: RISK_ORDER.get(str(r.get("overall_risk", "")).upper(), 3))
+    counts = {level: sum(c["risk_level"] == level for c in clauses) for level in RISK_ORDER}
+    summary = (f"{lead.get('summary', '').strip()} Reviewed in {len(results)} parts: "
+               f"{counts['HIGH']} high, {counts['MEDIUM']} medium and {counts['LOW']} low-risk clauses flagged.").strip()
+    return {"overall_risk": overall, "summary": summary,
+            "total_clauses_flagged": len(clauses), "clauses": clauses}
+
+
+def count_parts(text):
+    """Model calls analyze_text will make for this text."""
+    if ANALYSIS_MODE != "mapreduce" or len(text) <= CHUNK_CHARS:
+        return 1
+    return len(split_sections(text[:MAX_CHARS]))
+
+
+def analyze_text(client, text):
+    """Analyse extracted document text. Returns (result, err)."""
+    if ANALYSIS_MODE != "mapreduce" or len(text) <= CHUNK_CHARS:
+        try:
+            return _analyze_chunk(client, text[:CHUNK_CHARS], 1, 1), None
+        except json.JSONDecodeError as e:
+            return None, f"AI returned invalid JSON: {e}"
+        except Exception as e:
+            return None, str(e)
+
+    chunks = split_sections(text[:MAX_CHARS])
+    with ThreadPoolExecutor(max_workers=max(1, CONCURRENCY)) as pool:
+        futures = [pool.submit(_chunk_task, client, chunk, i, len(chunks))
+                   for i, chunk in enumerate(chunks, 1)]
+    results, errors = [], []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except json.JSONDecodeError as e:
+            errors.append(f"AI returned invalid JSON: {e}")
+        except Exception as e:
+            errors.append(str(e))
+    if not results:
+        return None, errors[0]
+    result = merge_analyses(results)
+    result["parts"] = len(chunks)
+    if errors:
+        result["parts_failed"] = len(errors)
+        result["summary"] += f" {len(errors)} of {len(chunks)} parts could not be analysed."
+    return result, None
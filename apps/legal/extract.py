@@ -0,0 +1,162 @@
+"""
+Text extraction for uploaded legal documents.
+Extraction stops as soon as the caller's character budget is met, so pages
+past what the analysis will use are never parsed. When a budget does need the
+rest of a long PDF, page ranges are extracted in parallel in the shared job
+pool. Results are cached in the legal_texts table by file hash, so
+re-analysing a document never re-parses it.
+"""
+import os, hashlib, multiprocessing
+from collections import deque
+from datetime import datetime
+
+from db import get_db
+from metrics import timed
+from jobs import get_pool, JOB_WORKERS
+
+# Pages read in-process before a long PDF is handed to the job pool. Most
+# budgets are met long before this, and a pool worker has to re-open the PDF.
+SERIAL_PAGES = int(os.environ.get("LEGAL_SERIAL_PAGES", "16"))
+# Only PDFs with at least this many pages left to read go to the pool (and
+# only when it has more than one worker).
+PARALLEL_MIN_PAGES = int(os.environ.get("LEGAL_PARALLEL_MIN_PAGES", "48"))
+PAGES_PER_TASK = int(os.environ.get("LEGAL_PAGES_PER_TASK", "24"))
+
+
+def file_hash(path):
+    """sha256 of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _budget_met(total, max_chars):
+    return max_chars is not None and total >= max_chars
+
+
+def _append(parts, text, total):
+    """Append text to parts. Returns the new total: the length of the parts
+    joined by newlines, as the text is returned."""
+    if parts:
+        total += 1
+    parts.append(text)
+    return total + len(text)
+
+
+def _read_pages(pages, parts, total, max_chars):
+    """Append page texts to parts until the budget is met. Returns the new total."""
+    for page in pages:
+        total = _append(parts, page.extract_text() or "", total)
+        if _budget_met(total, max_chars):
+            break
+    return total
+
+
+def extract_page_range(path, start, stop):
+    """Job-pool task: the text of pages [start, stop) of a PDF."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _extract_pdf(path, max_chars):
+    """(text, complete) of a PDF: the first SERIAL_PAGES pages in-process,
+    the rest serially or in page ranges on the job pool."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    n = len(reader.pages)
+    parts = []
+    first = min(n, SERIAL_PAGES)
+    total = _read_pages((reader.pages[i] for i in range(first)), parts, total=0, max_chars=max_chars)
+    if _budget_met(total, max_chars):
+        return "\n".join(parts), len(parts) == n
+
+    # Inside a job-pool child (the async pipeline's extraction step) read
+    # serially rather than starting a pool of its own.
+    nested = multiprocessing.parent_process() is not None
+    if n - first < PARALLEL_MIN_PAGES or JOB_WORKERS < 2 or nested:
+        total = _read_pages((reader.pages[i] for i in range(first, n)), parts, total, max_chars)
+        return "\n".join(parts), len(parts) == n
+
+    # Keep a window of page ranges in flight and consume them in order, so
+    # nothing past the budget is submitted and the rest can be cancelled.
+    ranges = iter([(i, min(i + PAGES_PER_TASK, n)) for i in range(first, n, PAGES_PER_TASK)])
+    pool = get_pool()
+    in_flight = deque()
+    for start, stop in ranges:
+        in_flight.append(pool.submit(extract_page_range, path, start, stop))
+        if len(in_flight) >= JOB_WORKERS * 2:
+            break
+    try:
+        while in_flight:
+            for text in in_flight.popleft().result():
+                total = _append(parts, text, total)
+            if _budget_met(total, max_chars):
+                break
+            nxt = next(ranges, None)
+            if nxt:
+                in_flight.append(pool.submit(extract_page_range, path, *nxt))
+    finally:
+        for f in in_flight:
+            f.cancel()
+    return "\n".join(parts), len(parts) >= n
+
+
+def _extract_docx(path, max_chars):
+    import docx
+    d = docx.Document(path)
+    parts, total = [], 0
+    for p in d.paragraphs:
+        total = _append(parts, p.text, total)
+        if _budget_met(total, max_chars):
+            return "\n".join(parts), len(parts) == len(d.paragraphs)
+    return "\n".join(parts), True
+
+
+def _extract_txt(path, max_chars):
+    with open(path, "r", errors="ignore") as f:
+        if max_chars is None:
+            return f.read(), True
+        text = f.read(max_chars)
+        return text, not f.read(1)
+
+
+def _extract(path, ext, max_chars):
+    if ext == "pdf":
+        return _extract_pdf(path, max_chars)
+    if ext in ("docx", "doc"):
+        return _extract_docx(path, max_chars)
+    return _extract_txt(path, max_chars)
+
+
+def _cache_get(key):
+    conn = get_db()
+    row = conn.execute("SELECT text, complete FROM legal_texts WHERE file_hash=?", (key,)).fetchone()
+    conn.close()
+    return (row["text"], bool(row["complete"])) if row else None
+
+
+def _cache_put(key, text, complete):
+    conn = get_db()
+    conn.execute("INSERT OR REPLACE INTO legal_texts (file_hash, text, complete, created_at) VALUES (?,?,?,?)",
+                 (key, text, int(complete), datetime.utcnow().isoformat()))
+    conn.commit()
+    conn.close()
+
+
+@timed("legal.extract_text")
+def extract_text(path, ext, max_chars=None, digest=None):
+    """Text of an uploaded document, reading no further than max_chars
+    (None = the whole document). digest is the file's sha256 if already known."""
+    key = digest or file_hash(path)
+    cached = _cache_get(key)
+    if cached:
+        text, complete = cached
+        if complete or _budget_met(len(text), max_chars):
+            return text if max_chars is None else text[:max_chars]
+    text, complete = _extract(path, ext, max_chars)
+    if not cached or len(text) > len(cached[0]):
+        _cache_put(key, text, complete)
+    return text if max_chars is None else text[:max_chars]
@@ -1,18 +1,33 @@
-import os, io, uuid, json, sqlite3
+import os, io, uuid, json, sqlite3, hashlib
 from datetime import datetime
 from flask import (Blueprint, render_template, request, jsonify,
                    send_file, redirect, url_for, session, Response)
 from werkzeug.utils import secure_filename
-from groq import Groq
-from db import get_db, get_setting, set_setting
-from cleanup import purge_legal_uploads
+from db import get_db, get_setting, set_setting, list_page, report_page
+from llm import get_client
+from metrics import timed, app_summary
+from cleanup import (purge_legal_uploads, purge_legal_reports, register_sweep,
+                     track_file, untrack_file)
+from jobs import submit as submit_job, submit_io
+from apps.legal.extract import extract_text
+from apps.legal.analysis import analyze_text, text_budget, count_parts, SYNC_MAX_PARTS
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.colors import HexColor, black
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 
 legal_bp = Blueprint("legal", __name__)
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads", "legal")
 GEN_DIR    = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "generated", "legal")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploads are stored content-addressed as <sha256>.<ext>; one blob can back
+# many legal_documents rows. Partial uploads live in tmp/ until hashed.
+UPLOAD_TMP_DIR = os.path.join(UPLOAD_DIR, "tmp")
+os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
 os.makedirs(GEN_DIR, exist_ok=True)
+register_sweep("legal", purge_legal_uploads, UPLOAD_DIR)
+register_sweep("legal-reports", purge_legal_reports, GEN_DIR)
 
 ALLOWED = {"pdf", "docx", "txt", "doc"}
 ADMIN_PW_KEY = "legal_admin_pw"
@@ -29,194 +44,390 @@ def allowed(fn):
 
 def get_groq():
     key = get_setting("legal_settings", "groq_api_key")
-    return Groq(api_key=key) if key else None
-
-def extract_text(path, ext):
-    if ext == "pdf":
-        from pypdf import PdfReader
-        r = PdfReader(path)
-        return "\n".join(p.extract_text() or "" for p in r.pages)
-    elif ext in ("docx", "doc"):
-        import docx
-        d = docx.Document(path)
-        return "\n".join(p.text for p in d.paragraphs)
-    else:
-        with open(path, "r", errors="ignore") as f:
-            return f.read()
+    return get_client(key)
+
+
+def save_upload(f):
+    """Stream an upload into UPLOAD_TMP_DIR, hashing it on the way.
+    Returns (sha256 hex digest, temp path)."""
+    h = hashlib.sha256()
+    tmp = os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4().hex}.part")
+    with open(tmp, "wb") as out:
+        for block in iter(lambda: f.stream.read(1024 * 1024), b""):
+            h.update(block)
+            out.write(block)
+    return h.hexdigest(), tmp
+
+
+def latest_analysis(conn, file_hash):
+    """Most recent analysis of any document with this content, or None."""
+    if not file_hash:
+        return None
+    return conn.execute("""
+        SELECT a.* FROM legal_documents d
+        JOIN legal_analyses a ON a.doc_id=d.id
+        WHERE d.file_hash=? ORDER BY a.created_at DESC LIMIT 1""", (file_hash,)).fetchone()
+
+
+def analysis_result(ana):
+    clauses = json.loads(ana["clauses"])
+    return {"overall_risk": ana["overall_risk"], "summary": ana["summary"],
+            "total_clauses_flagged": len(clauses), "clauses": clauses}
 
 
 def delete_document(doc_id):
-    """Remove one document and its analysis from DB and filesystem."""
+    """Remove one document and its analysis from DB, and its blob from the
+    filesystem unless another document shares it."""
     conn = get_db()
+    # Write lock first, so no upload can add a reference to the blob between
+    # the reference check and the unlink.
+    conn.execute("BEGIN IMMEDIATE")
     row = conn.execute("SELECT filename FROM legal_documents WHERE id=?", (doc_id,)).fetchone()
     if row:
-        fpath = os.path.join(UPLOAD_DIR, row["filename"])
-        if os.path.exists(fpath):
+        conn.execute("DELETE FROM legal_analyses WHERE doc_id=?", (doc_id,))
+        conn.execute("DELETE FROM legal_documents WHERE id=?", (doc_id,))
+        if not conn.execute("SELECT 1 FROM legal_documents WHERE filename=? LIMIT 1",
+                            (row["filename"],)).fetchone():
+            path = os.path.join(UPLOAD_DIR, row["filename"])
             try:
-                os.remove(fpath)
+                os.remove(path)
             except OSError:
                 pass
-        conn.execute("DELETE FROM legal_analyses WHERE doc_id=?", (doc_id,))
-        conn.execute("DELETE FROM legal_documents WHERE id=?", (doc_id,))
-        conn.commit()
+            untrack_file(path, conn=conn)
+    conn.commit()
     conn.close()
 
 def analyze_with_groq(text):
     client = get_groq()
     if not client:
         return None, "Groq API key not configured. Set it in /legal/julisunkan"
-    trimmed = text[:12000]
-    system = (
-        "You are an expert legal analyst specializing in contract law and risk assessment. "
-        "Analyze legal documents and identify dangerous, unfair, or risky clauses. "
-        "Always respond with valid JSON only, no markdown, no extra text."
-    )
-    prompt = f"""Analyze the following legal document and identify all risky, dangerous, or potentially harmful clauses.
-
-DOCUMENT:
-{trimmed}
-
-Return ONLY this exact JSON structure:
-{{
-  "overall_risk": "HIGH or MEDIUM or LOW",
-  "summary": "2-3 sentence overall assessment",
-  "total_clauses_flagged": 0,
-  "clauses": [
-    {{
-      "clause_text": "exact problematic text excerpt (max 200 chars)",
-      "risk_level": "HIGH or MEDIUM or LOW",
-      "risk_type": "category like Liability, Termination, Penalty, IP Rights, Non-Compete, Arbitration, etc.",
-      "explanation": "detailed explanation of why this is risky",
-      "recommendation": "specific actionable recommendation"
-    }}
-  ]
-}}"""
-    try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "system", "content": system},
-                      {"role": "user", "content": prompt}],
-            max_tokens=4096, temperature=0.2)
-        raw = resp.choices[0].message.content.strip()
-        if raw.startswith("```"):
-            raw = raw.split("```")[1]
-            if raw.startswith("json"):
-                raw = raw[4:]
-        return json.loads(raw), None
-    except json.JSONDecodeError as e:
-        return None, f"AI returned invalid JSON: {e}"
-    except Exception as e:
-        return None, str(e)
-
-def build_pdf_report(analysis, original_name):
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.colors import HexColor, black
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-
-    buf = io.BytesIO()
+    return analyze_text(client, text)
+
+# ── PDF report ──────────────────────────────────────────────────
+# Styles are immutable once built, so they are shared by every report.
+
+NAVY   = HexColor("#1a2744")
+GOLD   = HexColor("#c9a84c")
+RED    = HexColor("#c0392b")
+ORANGE = HexColor("#e67e22")
+GREEN  = HexColor("#27ae60")
+RISK_COLORS = {"HIGH": RED, "MEDIUM": ORANGE, "LOW": GREEN}
+
+TITLE_STYLE   = ParagraphStyle("title",   fontName="Helvetica-Bold", fontSize=20, textColor=NAVY, spaceAfter=6)
+SUB_STYLE     = ParagraphStyle("sub",     fontName="Helvetica",      fontSize=11, textColor=HexColor("#555555"), spaceAfter=12)
+HEADING_STYLE = ParagraphStyle("heading", fontName="Helvetica-Bold", fontSize=13, textColor=NAVY, spaceBefore=12, spaceAfter=6)
+BODY_STYLE    = ParagraphStyle("body",    fontName="Helvetica",      fontSize=10, textColor=black, spaceAfter=4, leading=14)
+CLAUSE_TEXT_STYLE = ParagraphStyle("ct", fontName="Helvetica-Oblique", fontSize=9, textColor=HexColor("#333333"), spaceAfter=4, leftIndent=12)
+OVERALL_STYLES = {level: ParagraphStyle(f"or_{level}", fontName="Helvetica-Bold", fontSize=14, textColor=color, spaceAfter=6)
+                  for level, color in RISK_COLORS.items()}
+OVERALL_STYLES[None] = ParagraphStyle("or", fontName="Helvetica-Bold", fontSize=14, textColor=NAVY, spaceAfter=6)
+CLAUSE_HEAD_STYLES = {level: ParagraphStyle(f"ch_{level}", fontName="Helvetica-Bold", fontSize=11, textColor=color, spaceBefore=10, spaceAfter=4)
+                      for level, color in RISK_COLORS.items()}
+
+# Bump whenever build_pdf_report output changes, to invalidate cached reports.
+REPORT_VERSION = "1"
+REPORT_TMP_DIR = os.path.join(GEN_DIR, "tmp")
+os.makedirs(REPORT_TMP_DIR, exist_ok=True)
+
+
+@timed("legal.build_pdf_report")
+def build_pdf_report(analysis, original_name, out=None):
+    buf = io.BytesIO() if out is None else out
     doc = SimpleDocTemplate(buf, pagesize=letter,
                             leftMargin=0.75*inch, rightMargin=0.75*inch,
                             topMargin=0.75*inch, bottomMargin=0.75*inch)
-    styles = getSampleStyleSheet()
-    navy   = HexColor("#1a2744")
-    gold   = HexColor("#c9a84c")
-    red    = HexColor("#c0392b")
-    orange = HexColor("#e67e22")
-    green  = HexColor("#27ae60")
-
-    title_style   = ParagraphStyle("title",   fontName="Helvetica-Bold", fontSize=20, textColor=navy, spaceAfter=6)
-    sub_style     = ParagraphStyle("sub",     fontName="Helvetica",      fontSize=11, textColor=HexColor("#555555"), spaceAfter=12)
-    heading_style = ParagraphStyle("heading", fontName="Helvetica-Bold", fontSize=13, textColor=navy, spaceBefore=12, spaceAfter=6)
-    body_style    = ParagraphStyle("body",    fontName="Helvetica",      fontSize=10, textColor=black, spaceAfter=4, leading=14)
-    risk_colors   = {"HIGH": red, "MEDIUM": orange, "LOW": green}
 
     story = []
-    story.append(Paragraph("Legal Document Risk Analysis Report", title_style))
-    story.append(Paragraph(f"Document: {original_name} &nbsp;|&nbsp; Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M')} UTC", sub_style))
+    story.append(Paragraph("Legal Document Risk Analysis Report", TITLE_STYLE))
+    story.append(Paragraph(f"Document: {original_name} &nbsp;|&nbsp; Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M')} UTC", SUB_STYLE))
     story.append(Spacer(1, 0.1*inch))
 
     overall = analysis.get("overall_risk", "UNKNOWN")
-    oc = risk_colors.get(overall, navy)
-    story.append(Paragraph(f'<font color="{oc.hexval()}">● Overall Risk: {overall}</font>', ParagraphStyle("or", fontName="Helvetica-Bold", fontSize=14, textColor=oc, spaceAfter=6)))
-    story.append(Paragraph(analysis.get("summary", ""), body_style))
+    oc = RISK_COLORS.get(overall, NAVY)
+    story.append(Paragraph(f'<font color="{oc.hexval()}">● Overall Risk: {overall}</font>',
+                           OVERALL_STYLES.get(overall, OVERALL_STYLES[None])))
+    story.append(Paragraph(analysis.get("summary", ""), BODY_STYLE))
     story.append(Spacer(1, 0.2*inch))
 
     for i, clause in enumerate(analysis.get("clauses", []), 1):
         rl = clause.get("risk_level", "MEDIUM")
-        rc2 = risk_colors.get(rl, orange)
+        rc2 = RISK_COLORS.get(rl, ORANGE)
         story.append(Paragraph(f'<font color="{rc2.hexval()}">[{rl}] Clause {i}: {clause.get("risk_type","")}</font>',
-                                ParagraphStyle("ch", fontName="Helvetica-Bold", fontSize=11, textColor=rc2, spaceBefore=10, spaceAfter=4)))
-        story.append(Paragraph(f'<i>"{clause.get("clause_text","")}"</i>', ParagraphStyle("ct", fontName="Helvetica-Oblique", fontSize=9, textColor=HexColor("#333333"), spaceAfter=4, leftIndent=12)))
-        story.append(Paragraph(f"<b>Risk:</b> {clause.get('explanation','')}", body_style))
-        story.append(Paragraph(f"<b>Recommendation:</b> {clause.get('recommendation','')}", body_style))
+                               CLAUSE_HEAD_STYLES.get(rl, CLAUSE_HEAD_STYLES["MEDIUM"])))
+        story.append(Paragraph(f'<i>"{clause.get("clause_text","")}"</i>', CLAUSE_TEXT_STYLE))
+        story.append(Paragraph(f"<b>Risk:</b> {clause.get('explanation','')}", BODY_STYLE))
+        story.append(Paragraph(f"<b>Recommendation:</b> {clause.get('recommendation','')}", BODY_STYLE))
         story.append(Spacer(1, 0.05*inch))
 
     doc.build(story)
-    buf.seek(0)
+    if out is None:
+        buf.seek(0)
     return buf
 
 
+def report_etag(analysis_id):
+    return f"{analysis_id}-{REPORT_VERSION}"
+
+
+def report_path(analysis_id):
+    """Cached report for one analysis: generated/legal/<analysis_id>-<version>.pdf.
+    Analyses are never modified, so the file is valid for the analysis' lifetime."""
+    return os.path.join(GEN_DIR, f"{report_etag(analysis_id)}.pdf")
+
+
+def ensure_report(ana, original_name):
+    """Render the report for an analysis row unless it is already cached.
+    A cache hit extends the file's expiry, so a report that keeps being
+    downloaded is not purged on its first-render date."""
+    path = report_path(ana["id"])
+    try:
+        track_file(path)
+        return path
+    except FileNotFoundError:
+        pass
+    tmp = os.path.join(REPORT_TMP_DIR, f"{uuid.uuid4().hex}.pdf")
+    try:
+        with open(tmp, "wb") as f:
+            build_pdf_report(analysis_result(ana), original_name, out=f)
+        os.replace(tmp, path)
+        track_file(path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
 # ── Routes ───────────────────────────────────────────────────────
 
 @legal_bp.route("/")
 def index():
-    purge_legal_uploads(UPLOAD_DIR)
     conn = get_db()
     docs = conn.execute("SELECT * FROM legal_documents ORDER BY created_at DESC LIMIT 20").fetchall()
     conn.close()
     return render_template("legal/index.html", docs=docs)
 
 
-@legal_bp.route("/upload", methods=["POST"])
-def upload():
+def parse_upload():
+    """The validated upload from the request, or (None, err)."""
     if "file" not in request.files:
-        return jsonify({"error": "No file provided"}), 400
+        return None, "No file provided"
     f = request.files["file"]
     if not f.filename or not allowed(f.filename):
-        return jsonify({"error": "Upload PDF, DOCX, or TXT files only"}), 400
+        return None, "Upload PDF, DOCX, or TXT files only"
+    return f, None
+
+
+def store_upload(f, status="pending"):
+    """Save an upload and insert its legal_documents row. Returns (doc_id, sha256)."""
     ext = f.filename.rsplit(".", 1)[1].lower()
-    doc_id  = str(uuid.uuid4())
-    stored  = f"{doc_id}.{ext}"
-    path    = os.path.join(UPLOAD_DIR, stored)
-    f.save(path)
+    doc_id = str(uuid.uuid4())
+    digest, tmp = save_upload(f)
+    stored = f"{digest}.{ext}"
     conn = get_db()
-    conn.execute("INSERT INTO legal_documents VALUES (?,?,?,?,?,?)",
-                 (doc_id, stored, secure_filename(f.filename), ext, "pending", now()))
+    ts = now()
+    conn.execute("""INSERT INTO legal_documents
+                    (id, filename, original_name, file_type, status, created_at, file_hash, status_updated_at)
+                    VALUES (?,?,?,?,?,?,?,?)""",
+                 (doc_id, stored, secure_filename(f.filename), ext, status, ts, digest, ts))
+    # Same transaction: a shared blob's expiry follows its newest document.
+    track_file(os.path.join(UPLOAD_DIR, stored), size=os.path.getsize(tmp), conn=conn)
     conn.commit()
     conn.close()
-    return jsonify({"doc_id": doc_id, "name": f.filename})
+    # The row referencing the blob is committed before the blob is (re)placed,
+    # so a concurrent purge or delete can never leave this document without
+    # its file. Replacing an identical blob is a cheap rename.
+    os.replace(tmp, os.path.join(UPLOAD_DIR, stored))
+    return doc_id, digest
+
+
+def reuse_analysis(conn, row):
+    """If the same content was analysed before (by this or another upload),
+    attach that analysis to this document, skipping both extraction and the
+    model call. Returns (analysis_id, result) or None."""
+    prev = latest_analysis(conn, row["file_hash"])
+    if not prev:
+        return None
+    analysis_id = prev["id"]
+    if prev["doc_id"] != row["id"]:
+        analysis_id = str(uuid.uuid4())
+        conn.execute("INSERT INTO legal_analyses VALUES (?,?,?,?,?,?)",
+                     (analysis_id, row["id"], prev["overall_risk"], prev["summary"], prev["clauses"], now()))
+    conn.execute("UPDATE legal_documents SET status='analysed', error=NULL, status_updated_at=? WHERE id=?",
+                 (now(), row["id"]))
+    conn.commit()
+    return analysis_id, analysis_result(prev)
 
 
-@legal_bp.route("/analyze/<doc_id>", methods=["POST"])
-def analyze(doc_id):
+def save_analysis(doc_id, result):
+    analysis_id = str(uuid.uuid4())
+    result["total_clauses_flagged"] = len(result.get("clauses", []))
+    conn = get_db()
+    conn.execute("INSERT INTO legal_analyses VALUES (?,?,?,?,?,?)",
+                 (analysis_id, doc_id, result.get("overall_risk","UNKNOWN"),
+                  result.get("summary",""), json.dumps(result.get("clauses",[])), now()))
+    conn.execute("UPDATE legal_documents SET status='analysed', error=NULL, status_updated_at=? WHERE id=?",
+                 (now(), doc_id))
+    conn.commit()
+    conn.close()
+    return analysis_id
+
+
+def get_document(doc_id):
     conn = get_db()
     row = conn.execute("SELECT * FROM legal_documents WHERE id=?", (doc_id,)).fetchone()
     conn.close()
-    if not row:
-        return jsonify({"error": "Document not found"}), 404
+    return row
+
+
+def document_text(row):
     path = os.path.join(UPLOAD_DIR, row["filename"])
     if not os.path.exists(path):
-        return jsonify({"error": "Document file has expired and was removed."}), 410
-    text = extract_text(path, row["file_type"])
+        raise FileNotFoundError("Document file has expired and was removed.")
+    text = extract_text(path, row["file_type"], max_chars=text_budget(), digest=row["file_hash"])
     if not text.strip():
-        return jsonify({"error": "Could not extract text from document"}), 400
+        raise ValueError("Could not extract text from document")
+    return text
+
+
+# ── Async pipeline ──────────────────────────────────────────────
+# POST /jobs stores the upload and queues extraction in the job pool (CPU).
+# When that finishes, the analysis is queued on an I/O thread, so a slow model
+# call never holds a gunicorn worker or a render process, and the next
+# document's extraction overlaps with it. Progress is legal_documents.status:
+# queued -> extracting -> extracted -> analysing -> analysed | failed. A job lost
+# with its worker is failed by the cleanup sweep once its status has not
+# changed for JOB_STALE_MINUTES (status_updated_at).
+
+def set_document_status(doc_id, status, error=None):
+    conn = get_db()
+    conn.execute("UPDATE legal_documents SET status=?, error=?, status_updated_at=? WHERE id=?",
+                 (status, error, now(), doc_id))
+    conn.commit()
+    conn.close()
+
+
+def fail_document(doc_id, exc):
+    set_document_status(doc_id, "failed", str(exc) or type(exc).__name__)
+
+
+def run_extract_job(doc_id):
+    """Job-pool entry point: extract a queued document's text into the
+    legal_texts cache, where run_analysis_job picks it up."""
+    row = get_document(doc_id)
+    if not row:
+        raise LookupError("Document not found")
+    set_document_status(doc_id, "extracting")
+    document_text(row)
+    set_document_status(doc_id, "extracted")
+
+
+def run_analysis_job(doc_id):
+    """I/O-pool entry point: analyse an extracted document."""
+    row = get_document(doc_id)
+    if not row:
+        raise LookupError("Document not found")
+    set_document_status(doc_id, "analysing")
+    result, err = analyze_with_groq(document_text(row))
+    if err:
+        raise RuntimeError(err)
+    save_analysis(doc_id, result)
+
+
+def start_pipeline(doc_id):
+    on_error = lambda e: fail_document(doc_id, e)
+    submit_job(run_extract_job, doc_id, on_error=on_error,
+               on_success=lambda _: submit_io(run_analysis_job, doc_id, on_error=on_error))
+
+
+@legal_bp.route("/upload", methods=["POST"])
+def upload():
+    f, err = parse_upload()
+    if err:
+        return jsonify({"error": err}), 400
+    doc_id, digest = store_upload(f)
+    conn = get_db()
+    known = latest_analysis(conn, digest) is not None
+    conn.close()
+    return jsonify({"doc_id": doc_id, "name": f.filename, "already_analysed": known})
+
+
+@legal_bp.route("/analyze/<doc_id>", methods=["POST"])
+def analyze(doc_id):
+    row = get_document(doc_id)
+    if not row:
+        return jsonify({"error": "Document not found"}), 404
+    conn = get_db()
+    reused = reuse_analysis(conn, row)
+    conn.close()
+    if reused:
+        analysis_id, result = reused
+        return jsonify({"analysis_id": analysis_id, "result": result, "reused": True})
+    try:
+        text = document_text(row)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 410
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if count_parts(text) > SYNC_MAX_PARTS:
+        # Too long to analyse within one request under the rate limit; poll
+        # GET /jobs/<doc_id> as for POST /jobs.
+        set_document_status(doc_id, "queued")
+        try:
+            start_pipeline(doc_id)
+        except Exception as e:
+            fail_document(doc_id, e)
+            return jsonify({"error": str(e)}), 500
+        return jsonify({"doc_id": doc_id, "status": "queued"}), 202
     result, err = analyze_with_groq(text)
     if err:
         return jsonify({"error": err}), 500
-    analysis_id = str(uuid.uuid4())
-    result["total_clauses_flagged"] = len(result.get("clauses", []))
-    conn2 = get_db()
-    conn2.execute("INSERT INTO legal_analyses VALUES (?,?,?,?,?,?)",
-                  (analysis_id, doc_id, result.get("overall_risk","UNKNOWN"),
-                   result.get("summary",""), json.dumps(result.get("clauses",[])), now()))
-    conn2.execute("UPDATE legal_documents SET status='analysed' WHERE id=?", (doc_id,))
-    conn2.commit()
-    conn2.close()
+    analysis_id = save_analysis(doc_id, result)
     return jsonify({"analysis_id": analysis_id, "result": result})
 
 
+@legal_bp.route("/jobs", methods=["POST"])
+def submit_analysis_job():
+    f, err = parse_upload()
+    if err:
+        return jsonify({"error": err}), 400
+    if not get_groq():
+        return jsonify({"error": "Groq API key not configured. Set it in /legal/julisunkan"}), 500
+    doc_id, _ = store_upload(f, status="queued")
+    conn = get_db()
+    reused = reuse_analysis(conn, get_document(doc_id))
+    conn.close()
+    if reused:
+        analysis_id, result = reused
+        return jsonify({"doc_id": doc_id, "name": f.filename, "status": "analysed",
+                        "analysis_id": analysis_id, "result": result, "reused": True})
+    try:
+        start_pipeline(doc_id)
+    except Exception as e:
+        fail_document(doc_id, e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"doc_id": doc_id, "name": f.filename, "status": "queued"}), 202
+
+
+@legal_bp.route("/jobs/<doc_id>")
+def job_status(doc_id):
+    conn = get_db()
+    row = conn.execute("SELECT id, status, error FROM legal_documents WHERE id=?", (doc_id,)).fetchone()
+    ana = None
+    if row and row["status"] == "analysed":
+        ana = conn.execute("SELECT * FROM legal_analyses WHERE doc_id=? ORDER BY created_at DESC LIMIT 1",
+                           (doc_id,)).fetchone()
+    conn.close()
+    if not row:
+        return jsonify({"error": "Not found"}), 404
+    result = {"doc_id": row["id"], "status": row["status"]}
+    if row["status"] == "failed":
+        result["error"] = row["error"] or "Analysis failed"
+    if ana:
+        result["analysis_id"] = ana["id"]
+        result["result"] = analysis_result(ana)
+    return jsonify(result)
+
+
 @legal_bp.route("/report/<doc_id>")
 def download_report(doc_id):
     conn = get_db()
@@ -225,29 +436,39 @@ def download_report(doc_id):
     conn.close()
     if not doc or not ana:
         return jsonify({"error": "Report not found. The document may have been deleted or not yet analysed."}), 404
-    analysis = {
-        "overall_risk": ana["overall_risk"],
-        "summary": ana["summary"],
-        "clauses": json.loads(ana["clauses"])
-    }
-    buf = build_pdf_report(analysis, doc["original_name"])
-    resp = send_file(buf, mimetype="application/pdf",
-                     as_attachment=True, download_name=f"risk_report_{doc_id[:8]}.pdf")
+    # Rendered once per analysis; repeat downloads are a sendfile of the
+    # cached PDF, or a 304 when the browser's ETag / Last-Modified still match.
+    send = lambda path: send_file(path, mimetype="application/pdf", etag=report_etag(ana["id"]),
+                                  conditional=True, max_age=0, as_attachment=True,
+                                  download_name=f"risk_report_{doc_id[:8]}.pdf")
+    try:
+        resp = send(ensure_report(ana, doc["original_name"]))
+    except FileNotFoundError:
+        # Purged between ensure_report and send_file; render it once more.
+        resp = send(ensure_report(ana, doc["original_name"]))
     resp.headers["Content-Disposition"] = f'attachment; filename="risk_report_{doc_id[:8]}.pdf"'
     return resp
 
 
+# Latest analysis per document, so a re-analysed document is listed once.
+_LATEST_ANALYSIS = "(SELECT a.{} FROM legal_analyses a WHERE a.doc_id=d.id ORDER BY a.created_at DESC LIMIT 1)"
+
+HISTORY_FIELDS = {
+    "id": "d.id", "original_name": "d.original_name", "file_type": "d.file_type",
+    "status": "d.status", "created_at": "d.created_at",
+    "overall_risk": _LATEST_ANALYSIS.format("overall_risk"),
+    "analysis_id": _LATEST_ANALYSIS.format("id"),
+}
+
+
 @legal_bp.route("/history")
 def history():
     conn = get_db()
-    rows = conn.execute("""
-        SELECT d.id, d.original_name, d.file_type, d.status, d.created_at,
-               a.overall_risk, a.id as analysis_id
-        FROM legal_documents d
-        LEFT JOIN legal_analyses a ON a.doc_id=d.id
-        ORDER BY d.created_at DESC""").fetchall()
+    page, err = list_page(conn, request.args, "legal_documents d", HISTORY_FIELDS, key="d.")
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 # ── Admin ────────────────────────────────────────────────────────
@@ -269,20 +490,16 @@ def admin():
         "max_file_mb": get_setting("legal_settings", "max_file_mb") or "10",
     }
     conn = get_db()
-    stats = {
-        "total_docs": conn.execute("SELECT COUNT(*) FROM legal_documents").fetchone()[0],
-        "analysed":   conn.execute("SELECT COUNT(*) FROM legal_documents WHERE status='analysed'").fetchone()[0],
-        "high_risk":  conn.execute("SELECT COUNT(*) FROM legal_analyses WHERE overall_risk='HIGH'").fetchone()[0],
-    }
-    docs = conn.execute("""
-        SELECT d.id, d.original_name, d.file_type, d.status, d.created_at,
-               a.overall_risk
-        FROM legal_documents d
-        LEFT JOIN legal_analyses a ON a.doc_id=d.id
-        ORDER BY d.created_at DESC""").fetchall()
+    stats = dict(conn.execute("""SELECT
+        (SELECT COUNT(*) FROM legal_documents) AS total_docs,
+        (SELECT COUNT(*) FROM legal_documents WHERE status='analysed') AS analysed,
+        (SELECT COUNT(*) FROM legal_analyses WHERE overall_risk='HIGH') AS high_risk""").fetchone())
+    docs, _ = list_page(conn, {}, "legal_documents d", HISTORY_FIELDS, key="d.",
+                        default_fields=("id", "original_name", "file_type", "status", "overall_risk"))
     conn.close()
     return render_template("legal/admin.html", logged_in=True, settings=settings,
-                           stats=stats, docs=docs, error=None)
+                           stats=stats, docs=docs["items"], docs_cursor=docs["next_cursor"],
+                           perf=app_summary("legal"), error=None)
 
 
 @legal_bp.route("/julisunkan/save", methods=["POST"])
@@ -315,8 +532,8 @@ def admin_delete_doc(doc_id):
 def admin_purge_expired():
     if not session.get("legal_admin"):
         return jsonify({"error": "Unauthorized"}), 401
-    purge_legal_uploads(UPLOAD_DIR)
-    return jsonify({"ok": True})
+    result = purge_legal_uploads(UPLOAD_DIR)
+    return jsonify({"ok": True, **result})
 
 
 # ── User Reports ─────────────────────────────────────────────────
@@ -342,9 +559,11 @@ def admin_reports():
     if not session.get("legal_admin"):
         return jsonify({"error": "Unauthorized"}), 401
     conn = get_db()
-    rows = conn.execute("SELECT * FROM legal_reports ORDER BY created_at DESC").fetchall()
+    page, err = report_page(conn, request.args, "legal_reports")
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 @legal_bp.route("/julisunkan/reports/<report_id>/review", methods=["POST"])
@@ -1,15 +1,17 @@
 import os, io, uuid, json
 from datetime import datetime
 from flask import (Blueprint, render_template, request, jsonify,
-                   send_file, redirect, url_for, session, Response)
-from groq import Groq
-from db import get_db, get_setting, set_setting
-from cleanup import purge_optimizer_files
+                   send_file, redirect, url_for, session, Response, stream_with_context)
+from db import get_db, get_setting, set_setting, list_page, report_page
+from llm import get_client, chat_json, stream_json, sse
+from cleanup import purge_optimizer_files, register_sweep
+from metrics import app_summary
 
 optimizer_bp = Blueprint("optimizer", __name__)
 
 GEN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "generated", "optimizer")
 os.makedirs(GEN_DIR, exist_ok=True)
+register_sweep("optimizer", purge_optimizer_files, GEN_DIR)
 
 ADMIN_PW_KEY = "opt_admin_pw"
 DEFAULT_PW   = "admin123"
@@ -31,13 +33,10 @@ def now():
 
 def get_groq_client():
     key = get_setting("opt_settings", "groq_api_key")
-    return Groq(api_key=key) if key else None
+    return get_client(key)
 
 
-def optimize_metadata(genre, audience, rough_title, raw_keywords, description_hint=""):
-    client = get_groq_client()
-    if not client:
-        return None, "Groq API key not configured. Visit /optimizer/julisunkan"
+def build_optimize_prompt(genre, audience, rough_title, raw_keywords, description_hint=""):
     system = (
         "You are a KDP publishing expert and SEO specialist. "
         "You create optimized book titles, descriptions, and keywords that maximize discoverability on Amazon KDP. "
@@ -87,16 +86,16 @@ Return ONLY this exact JSON:
   ],
   "seo_tips": ["tip1", "tip2", "tip3"]
 }}"""
+    return system, prompt
+
+
+def optimize_metadata(genre, audience, rough_title, raw_keywords, description_hint=""):
+    client = get_groq_client()
+    if not client:
+        return None, "Groq API key not configured. Visit /optimizer/julisunkan"
+    system, prompt = build_optimize_prompt(genre, audience, rough_title, raw_keywords, description_hint)
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role":"system","content":system},{"role":"user","content":prompt}],
-            max_tokens=4096, temperature=0.3)
-        raw = resp.choices[0].message.content.strip()
-        if raw.startswith("```"):
-            raw = raw.split("```")[1]
-            if raw.startswith("json"): raw = raw[4:]
-        return json.loads(raw), None
+        return chat_json(client, system, prompt, max_tokens=4096, temperature=0.3), None
     except json.JSONDecodeError as e:
         return None, f"AI returned invalid JSON: {e}"
     except Exception as e:
@@ -140,32 +139,72 @@ def export_txt(result, genre, rough_title):
 
 @optimizer_bp.route("/")
 def index():
-    purge_optimizer_files(GEN_DIR)
     return render_template("optimizer/index.html", categories=KDP_CATEGORIES)
 
 
-@optimizer_bp.route("/optimize", methods=["POST"])
-def optimize():
-    data = request.get_json(force=True)
+def parse_optimize_request(data):
     genre       = data.get("genre","").strip()[:100]
     audience    = data.get("audience","").strip()[:100]
     rough_title = data.get("rough_title","").strip()[:150]
     raw_kw      = data.get("keywords","").strip()[:300]
     desc_hint   = data.get("description_hint","").strip()[:500]
-    if not genre or not rough_title:
-        return jsonify({"error": "Genre and rough title are required"}), 400
-    result, err = optimize_metadata(genre, audience, rough_title, raw_kw, desc_hint)
-    if err:
-        return jsonify({"error": err}), 500
+    return genre, audience, rough_title, raw_kw, desc_hint
+
+
+def save_project(genre, audience, rough_title, raw_kw, result):
     proj_id = str(uuid.uuid4())
     conn = get_db()
     conn.execute("INSERT INTO opt_projects VALUES (?,?,?,?,?,?,?)",
                  (proj_id, genre, audience, rough_title, raw_kw, json.dumps(result), now()))
     conn.commit()
     conn.close()
+    return proj_id
+
+
+@optimizer_bp.route("/optimize", methods=["POST"])
+def optimize():
+    data = request.get_json(force=True)
+    genre, audience, rough_title, raw_kw, desc_hint = parse_optimize_request(data)
+    if not genre or not rough_title:
+        return jsonify({"error": "Genre and rough title are required"}), 400
+    result, err = optimize_metadata(genre, audience, rough_title, raw_kw, desc_hint)
+    if err:
+        return jsonify({"error": err}), 500
+    proj_id = save_project(genre, audience, rough_title, raw_kw, result)
     return jsonify({"project_id": proj_id, "result": result})
 
 
+@optimizer_bp.route("/optimize-stream", methods=["POST"])
+def optimize_stream():
+    """Server-sent events: an "item" event per title / keyword / bullet as the
+    model finishes it, then "result" with the saved project, or "error"."""
+    data = request.get_json(force=True)
+    genre, audience, rough_title, raw_kw, desc_hint = parse_optimize_request(data)
+    if not genre or not rough_title:
+        return jsonify({"error": "Genre and rough title are required"}), 400
+    client = get_groq_client()
+    if not client:
+        return jsonify({"error": "Groq API key not configured. Visit /optimizer/julisunkan"}), 500
+    system, prompt = build_optimize_prompt(genre, audience, rough_title, raw_kw, desc_hint)
+
+    def events():
+        try:
+            for kind, key, value in stream_json(client, system, prompt, max_tokens=4096, temperature=0.3,
+                                                watch=("titles", "keywords", "categories", "a_plus_bullets")):
+                if kind == "item":
+                    yield sse("item", {"key": key, "value": value})
+                else:
+                    proj_id = save_project(genre, audience, rough_title, raw_kw, value)
+                    yield sse("result", {"project_id": proj_id, "result": value})
+        except json.JSONDecodeError as e:
+            yield sse("error", {"error": f"AI returned invalid JSON: {e}"})
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
+
 @optimizer_bp.route("/export/<proj_id>")
 def export(proj_id):
     conn = get_db()
@@ -180,12 +219,19 @@ def export(proj_id):
                      download_name=f"kdp_metadata_{proj_id[:8]}.txt")
 
 
+# result is the full optimizer JSON; ask for it explicitly with ?fields=.
+HISTORY_FIELDS = ("id", "genre", "audience", "rough_title", "raw_keywords", "result", "created_at")
+
+
 @optimizer_bp.route("/history")
 def history():
     conn = get_db()
-    rows = conn.execute("SELECT id,genre,rough_title,created_at FROM opt_projects ORDER BY created_at DESC LIMIT 30").fetchall()
+    page, err = list_page(conn, request.args, "opt_projects", HISTORY_FIELDS,
+                          default_fields=("id", "genre", "rough_title", "created_at"))
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 @optimizer_bp.route("/result/<proj_id>")
@@ -214,7 +260,8 @@ def admin():
     conn.close()
     settings = {"groq_api_key": get_setting("opt_settings","groq_api_key"),
                 "admin_password": get_setting("opt_settings", ADMIN_PW_KEY) or DEFAULT_PW}
-    return render_template("optimizer/admin.html", logged_in=True, settings=settings, stats=stats, error=None)
+    return render_template("optimizer/admin.html", logged_in=True, settings=settings, stats=stats,
+                           perf=app_summary("optimizer"), error=None)
 
 
 @optimizer_bp.route("/julisunkan/save", methods=["POST"])
@@ -237,8 +284,8 @@ def admin_logout():
 def admin_purge_expired():
     if not session.get("opt_admin"):
         return jsonify({"error": "Unauthorized"}), 401
-    purge_optimizer_files(GEN_DIR)
-    return jsonify({"ok": True})
+    result = purge_optimizer_files(GEN_DIR)
+    return jsonify({"ok": True, **result})
 
 
 # ── User Reports ─────────────────────────────────────────────────
@@ -264,9 +311,11 @@ def admin_reports():
     if not session.get("opt_admin"):
         return jsonify({"error": "Unauthorized"}), 401
     conn = get_db()
-    rows = conn.execute("SELECT * FROM opt_reports ORDER BY created_at DESC").fetchall()
+    page, err = report_page(conn, request.args, "opt_reports")
     conn.close()
-    return jsonify([dict(r) for r in rows])
+    if err:
+        return jsonify({"error": err}), 400
+    return jsonify(page)
 
 
 @optimizer_bp.route("/julisunkan/reports/<report_id>/review", methods=["POST"])
@@ -0,0 +1,190 @@
+"""
+Local Groq-compatible chat completions server for load tests.
+Answers POST /openai/v1/chat/completions (plain and stream=true) with a reply
+in the JSON shape each app asks for, after simulating the model:
+
+    delay = latency (+/- jitter) + completion tokens / tokens-per-second
+
+With --max-inflight, requests over the limit get a 429 like a rate-limited
+account. GET /stats returns request counts and the peak concurrency seen.
+
+    python bench/fake_groq.py --port 8790 --latency 0.8 --tps 250 --tokens 600
+    GROQ_BASE_URL=http://127.0.0.1:8790 gunicorn main:app
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def legal_reply(prompt, n):
+    return {"overall_risk": random.choice(["HIGH", "MEDIUM", "LOW"]),
+            "summary": "Simulated assessment of the document.",
+            "total_clauses_flagged": 2,
+            "clauses": [{"clause_text": f"Simulated clause {i} {random.random():.6f}",
+                         "risk_level": random.choice(["HIGH", "MEDIUM", "LOW"]), "risk_type": "Liability",
+                         "explanation": "Simulated explanation.", "recommendation": "Simulated recommendation."}
+                        for i in range(2)]}
+
+
+def bulk_reply(prompt, n):
+    m = re.search(r"exactly (\d+) book", prompt)
+    count = int(m.group(1)) if m else 5
+    return [{"title": f"Simulated Book {random.random():.8f}", "subtitle": "A simulated subtitle",
+             "description": "Simulated description. " * 20, "keywords": [f"kw{i}" for i in range(7)],
+             "primary_category": "Books > Simulated", "secondary_category": "Books > Simulated > Sub",
+             "language": "English", "pages": 120, "price_usd": 7.99,
+             "target_audience": "Load testers", "unique_angle": "Simulated"} for _ in range(count)]
+
+
+def optimizer_reply(prompt, n):
+    return {"titles": [{"title": f"Title {i}", "subtitle": f"Subtitle {i}", "reason": "Simulated"} for i in range(5)],
+            "description": {"hook": "Simulated hook.", "body": "<p>Simulated body.</p>" * 10, "cta": "Buy now."},
+            "keywords": [f"keyword {i}" for i in range(7)],
+            "categories": [{"primary": "Books > Simulated", "reason": "Simulated"}] * 2,
+            "a_plus_bullets": [f"Bullet {i}" for i in range(5)], "seo_tips": ["tip1", "tip2", "tip3"]}
+
+
+def finder_reply(prompt, n):
+    return {"overall_opportunity": "HIGH", "market_summary": "Simulated market summary.",
+            "niches": [{"niche": f"Niche {i}", "competition": "LOW", "opportunity": "HIGH",
+                        "opportunity_score": 8, "estimated_monthly_searches": "10,000",
+                        "price_range": "$7-$12", "trend": "rising", "target_audience": "Simulated"} for i in range(6)],
+            "top_keywords": [{"keyword": f"keyword {i}", "monthly_searches": "5,000", "competition": "MEDIUM",
+                              "opportunity_score": 7, "avg_selling_price": "$8.99",
+                              "suggested_use": "keyword slot"} for i in range(15)],
+            "quick_wins": ["win 1", "win 2", "win 3"], "books_to_avoid": ["avoid 1"],
+            "seasonal_trends": "Simulated trends."}
+
+
+def generic_reply(prompt, n):
+    return {"enhanced_prompt": "Simulated prompt", "suggested_title": "Simulated Title",
+            "suggested_subtitle": "Simulated", "target_audience": "Simulated", "tips": ["a", "b", "c"]}
+
+
+# Picked by a key that only that app's prompt template contains.
+REPLIES = (('"overall_risk"', legal_reply), ('"unique_angle"', bulk_reply),
+           ('"a_plus_bullets"', optimizer_reply), ('"top_keywords"', finder_reply))
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = self.peak = self.requests = self.rejected = 0
+
+    def enter(self, limit):
+        with self.lock:
+            if limit and self.inflight >= limit:
+                self.rejected += 1
+                return False
+            self.inflight += 1
+            self.requests += 1
+            self.peak = max(self.peak, self.inflight)
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def as_dict(self):
+        with self.lock:
+            return {"requests": self.requests, "rejected": self.rejected,
+                    "inflight": self.inflight, "peak_inflight": self.peak}
+
+
+def make_handler(args, stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, code, body, ctype="application/json", headers=()):
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, json.dumps(stats.as_dict()).encode())
+            else:
+                self._send(404, b"{}")
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                return self._send(404, b"{}")
+            if not stats.enter(args.max_inflight):
+                return self._send(429, json.dumps({"error": {"message": "Rate limit reached (simulated)",
+                                                             "type": "rate_limit"}}).encode(),
+                                  headers=(("Retry-After", "1"),))
+            try:
+                self._complete(body)
+            finally:
+                stats.leave()
+
+        def _complete(self, body):
+            prompt = body["messages"][-1]["content"]
+            reply = next((fn for key, fn in REPLIES if key in prompt), generic_reply)
+            tokens = min(args.tokens, body.get("max_tokens") or args.tokens)
+            content = json.dumps(reply(prompt, tokens))
+            delay = max(0.0, args.latency + random.uniform(-args.jitter, args.jitter))
+            generate = tokens / args.tps if args.tps > 0 else 0.0
+            model = body.get("model", "fake")
+            if not body.get("stream"):
+                time.sleep(delay + generate)
+                return self._send(200, json.dumps({
+                    "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": tokens,
+                              "total_tokens": len(prompt) // 4 + tokens}}).encode())
+
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            pieces = [content[i:i + 64] for i in range(0, len(content), 64)]
+            for piece in pieces:
+                time.sleep(generate / len(pieces))
+                chunk = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [{"index": 0, "delta": {"content": piece},
+                                                      "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+        def _chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *a):
+            pass
+
+    return Handler
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--latency", type=float, default=0.8, help="seconds before the first token")
+    ap.add_argument("--jitter", type=float, default=0.2, help="+/- seconds of uniform latency jitter")
+    ap.add_argument("--tps", type=float, default=250, help="completion tokens per second (0 = instant)")
+    ap.add_argument("--tokens", type=int, default=600, help="completion tokens per reply (capped by max_tokens)")
+    ap.add_argument("--max-inflight", type=int, default=0, help="answer 429 above this many concurrent requests")
+    args = ap.parse_args(argv)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, Stats()))
+    server.daemon_threads = True
+    print(f"fake Groq on http://{args.host}:{args.port}", file=sys.stderr, flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
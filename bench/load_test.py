@@ -0,0 +1,410 @@
+"""
+Offline load test for the whole suite.
+Starts bench/fake_groq.py and the app under gunicorn against a scratch
+database (DATABASE_PATH), then drives a weighted mix of the model-backed
+endpoints from closed-loop client threads, one stage per --concurrency level:
+
+    optimizer  POST /optimizer/optimize
+    finder     POST /finder/search
+    bulk       POST /bulk/generate
+    legal      POST /legal/upload, then POST /legal/analyze/<id>
+    gen        POST /gen/generate (CPU-bound render, no model call)
+
+Every request uses fresh inputs, so the LLM response cache misses as it would
+for real users. Per stage it reports throughput, p50/p99 latency per endpoint,
+worker saturation (server busy time from /metrics over workers x threads x
+wall time, and the queueing it causes) and SQLite lock waits (a probe thread
+timing BEGIN IMMEDIATE against the same database).
+
+    python bench/load_test.py --concurrency 2,4,8 --duration 30 --out bench/load.json
+    python bench/load_test.py --workers 4 --threads 4 --groq-latency 2 --mix optimizer=1,legal=1
+
+The app runs from a scratch root (symlinks to this tree, with empty uploads/
+and generated/ directories beside the scratch database), so nothing the run
+writes reaches the real tree; the scratch root is deleted afterwards.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import socket
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_MIX = "optimizer=3,finder=3,bulk=2,legal=2,gen=1"
+APPS = ("legal", "gen", "optimizer", "bulk", "finder")
+PROBE_INTERVAL = 0.2
+LOCK_WAIT_SLOW_MS = 10
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url, timeout=60, proc=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"{url}: process exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _pct(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# ── Client ──────────────────────────────────────────────────────
+
+class Client:
+    def __init__(self, base, timeout, metrics_token=None):
+        self.base, self.timeout, self.metrics_token = base, timeout, metrics_token
+
+    def request(self, method, path, body=None, headers=None):
+        """(status, parsed JSON or None). Never raises for HTTP errors."""
+        req = urllib.request.Request(self.base + path, data=body, method=method, headers=headers or {})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                status, raw = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        except OSError as e:
+            return 0, {"error": str(e)}
+        try:
+            return status, json.loads(raw)
+        except ValueError:
+            return status, None
+
+    def post_json(self, path, data):
+        return self.request("POST", path, json.dumps(data).encode(), {"Content-Type": "application/json"})
+
+    def post_file(self, path, filename, content):
+        boundary = uuid.uuid4().hex
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+                f"Content-Type: text/plain\r\n\r\n").encode() + content + f"\r\n--{boundary}--\r\n".encode()
+        return self.request("POST", path, body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+
+def contract_text(nonce):
+    clauses = [f"{i}. Clause {i}. The Contractor shall indemnify the Client against all losses arising "
+               f"from section {i}, and either party may terminate on {random.randint(7, 90)} days notice."
+               for i in range(1, random.randint(8, 40))]
+    return (f"SERVICE AGREEMENT {nonce}\n\n" + "\n\n".join(clauses)).encode()
+
+
+def run_op(client, op, record):
+    """One user action from the mix; record(endpoint, seconds, status, error) per request."""
+    nonce = uuid.uuid4().hex[:10]
+
+    def timed(endpoint, fn, *args):
+        t0 = time.perf_counter()
+        status, data = fn(*args)
+        error = data.get("error") if isinstance(data, dict) and not 200 <= status < 300 else None
+        record(endpoint, time.perf_counter() - t0, status, error)
+        return status, data
+
+    if op == "optimizer":
+        timed("optimizer.optimize", client.post_json, "/optimizer/optimize",
+              {"genre": "Self-Help", "audience": "busy parents", "rough_title": f"Calm Mornings {nonce}",
+               "keywords": "routine, habits", "description_hint": "practical daily plan"})
+    elif op == "finder":
+        timed("finder.search", client.post_json, "/finder/search", {"topic": f"gardening journals {nonce}"})
+    elif op == "bulk":
+        timed("bulk.generate", client.post_json, "/bulk/generate",
+              {"niche": f"puzzle books {nonce}", "count": random.choice((5, 10, 20))})
+    elif op == "legal":
+        status, data = timed("legal.upload", client.post_file, "/legal/upload",
+                             f"contract-{nonce}.txt", contract_text(nonce))
+        if status == 200 and data and data.get("doc_id"):
+            timed("legal.analyze", client.request, "POST", f"/legal/analyze/{data['doc_id']}")
+    elif op == "gen":
+        from apps.gen.routes import INTERIOR_TEMPLATES, PAPER_SIZES
+        timed("gen.generate", client.post_json, "/gen/generate",
+              {"type": "interior", "template_id": random.choice(INTERIOR_TEMPLATES)["id"],
+               "paper_size": random.choice(list(PAPER_SIZES)), "page_count": random.choice((24, 120, 300))})
+    else:
+        raise ValueError(f"unknown op {op!r}")
+
+
+# ── Probes ──────────────────────────────────────────────────────
+
+def lock_probe(db_path, stop, waits):
+    """Time how long a writer waits for SQLite's write lock, every PROBE_INTERVAL."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    while not stop.wait(PROBE_INTERVAL):
+        t0 = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            waits.append(time.perf_counter() - t0)
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            waits.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def server_busy_seconds(client):
+    """Total request time recorded by the app's /metrics, and per endpoint."""
+    req = urllib.request.Request(client.base + "/metrics",
+                                 headers={"Authorization": f"Bearer {client.metrics_token}"})
+    try:
+        text = urllib.request.urlopen(req, timeout=10).read().decode()
+    except OSError:
+        return None, {}
+    total, per_endpoint = 0.0, {}
+    for line in text.splitlines():
+        if line.startswith("http_request_duration_seconds_sum{"):
+            labels, value = line[len("http_request_duration_seconds_sum{"):].rsplit("} ", 1)
+            endpoint = dict(kv.split("=", 1) for kv in labels.split(",")).get("endpoint", "").strip('"')
+            total += float(value)
+            per_endpoint[endpoint] = per_endpoint.get(endpoint, 0.0) + float(value)
+    return total, per_endpoint
+
+
+def groq_stats(url):
+    try:
+        return json.loads(urllib.request.urlopen(url + "/stats", timeout=5).read())
+    except OSError:
+        return {}
+
+
+# ── Stages ──────────────────────────────────────────────────────
+
+def run_stage(args, client, groq_url, concurrency, mix):
+    ops, weights = zip(*mix.items())
+    samples, lock = [], threading.Lock()
+    recording = threading.Event()
+
+    def record(endpoint, seconds, status, error):
+        if recording.is_set():
+            with lock:
+                samples.append((endpoint, seconds, 200 <= status < 300, status, error))
+
+    stop_at = time.monotonic() + args.warmup + args.duration
+
+    def user():
+        while time.monotonic() < stop_at:
+            run_op(client, random.choices(ops, weights)[0], record)
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    time.sleep(args.warmup)
+
+    # Flushed metric snapshots lag by METRICS_FLUSH_SECONDS.
+    busy_before, _ = server_busy_seconds(client)
+    groq_before = groq_stats(groq_url)
+    waits, probe_stop = [], threading.Event()
+    probe = threading.Thread(target=lock_probe, args=(args.db, probe_stop, waits), daemon=True)
+    recording.set()
+    probe.start()
+    t0 = time.monotonic()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+    recording.clear()
+    probe_stop.set()
+    probe.join()
+    time.sleep(args.metrics_flush + 0.5)
+    busy_after, _ = server_busy_seconds(client)
+    groq_after = groq_stats(groq_url)
+
+    endpoints = {}
+    for endpoint, seconds, ok, status, _error in samples:
+        e = endpoints.setdefault(endpoint, {"latencies": [], "errors": 0, "statuses": {}})
+        e["latencies"].append(seconds)
+        e["errors"] += not ok
+        e["statuses"][str(status)] = e["statuses"].get(str(status), 0) + 1
+    ms = lambda v: None if v is None else round(v * 1000, 1)
+    report_endpoints = {
+        name: {"requests": len(e["latencies"]), "errors": e["errors"], "statuses": e["statuses"],
+               "throughput_rps": round(len(e["latencies"]) / elapsed, 2),
+               "mean_ms": ms(statistics.fmean(e["latencies"])),
+               "p50_ms": ms(_pct(e["latencies"], 0.50)), "p99_ms": ms(_pct(e["latencies"], 0.99))}
+        for name, e in sorted(endpoints.items())}
+
+    all_latencies = [s[1] for s in samples]
+    slots = args.workers * args.threads
+    busy = None
+    if busy_before is not None and busy_after is not None:
+        busy = busy_after - busy_before
+    client_time = sum(all_latencies)
+    return {
+        "concurrency": concurrency, "seconds": round(elapsed, 1),
+        "requests": len(samples), "errors": sum(not s[2] for s in samples),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "p50_ms": ms(_pct(all_latencies, 0.50)), "p99_ms": ms(_pct(all_latencies, 0.99)),
+        "endpoints": report_endpoints,
+        "saturation": {
+            "worker_slots": slots,
+            # Share of worker x thread slots busy serving requests; ~1.0 means
+            # requests are queueing in the listen backlog.
+            # (Requests begun during warmup count in full, hence the cap.)
+            "busy_fraction": round(min(1.0, busy / (elapsed * slots)), 3) if busy is not None else None,
+            # Client-observed time not spent inside the app: queueing + transport.
+            "queue_share": round(max(0.0, 1 - busy / client_time), 3) if busy and client_time else None,
+        },
+        "sqlite_lock_wait": {
+            "probes": len(waits), "p50_ms": ms(_pct(waits, 0.50)), "p99_ms": ms(_pct(waits, 0.99)),
+            "max_ms": ms(max(waits) if waits else None),
+            f"over_{LOCK_WAIT_SLOW_MS}ms": sum(w * 1000 > LOCK_WAIT_SLOW_MS for w in waits),
+            "database_locked_errors": sum(1 for s in samples if s[4] and "locked" in str(s[4])),
+        },
+        "groq": {"requests": groq_after.get("requests", 0) - groq_before.get("requests", 0),
+                 "rejected_429": groq_after.get("rejected", 0) - groq_before.get("rejected", 0),
+                 "peak_inflight": groq_after.get("peak_inflight")},
+    }
+
+
+def print_stage(r):
+    sat, lw = r["saturation"], r["sqlite_lock_wait"]
+    print(f"\n== concurrency {r['concurrency']}: {r['requests']} requests in {r['seconds']}s, "
+          f"{r['throughput_rps']} req/s, p50 {r['p50_ms']} ms, p99 {r['p99_ms']} ms, {r['errors']} errors",
+          file=sys.stderr)
+    for name, e in r["endpoints"].items():
+        print(f"   {name:<20} {e['requests']:>6} req {e['throughput_rps']:>7} req/s "
+              f"p50 {e['p50_ms']:>9} ms  p99 {e['p99_ms']:>9} ms  errors {e['errors']}", file=sys.stderr)
+    print(f"   workers busy {sat['busy_fraction']} of {sat['worker_slots']} slots, queue share {sat['queue_share']}; "
+          f"sqlite lock wait p99 {lw['p99_ms']} ms, max {lw['max_ms']} ms; "
+          f"groq {r['groq']['requests']} calls, peak {r['groq']['peak_inflight']} in flight, "
+          f"{r['groq']['rejected_429']} x 429", file=sys.stderr)
+
+
+# ── Setup ───────────────────────────────────────────────────────
+
+def prepare_database(path):
+    """Create the scratch database with a (fake) Groq key for every app."""
+    env = {**os.environ, "DATABASE_PATH": path, "SWEEP_INTERVAL_SECONDS": "0"}
+    code = ("import db; db.init_db()\n"
+            f"for app in {APPS!r}: db.set_setting(app + '_settings' if app != 'optimizer' else 'opt_settings', "
+            "'groq_api_key', 'fake-key')\n")
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+
+
+def scratch_root(tmp):
+    """A copy of ROOT made of symlinks, minus the data it writes. The apps
+    put uploads/ and generated/ next to their own modules, so serving from
+    here keeps every file the run creates under tmp."""
+    root = os.path.join(tmp, "root")
+    os.makedirs(root)
+    for name in os.listdir(ROOT):
+        if name in ("uploads", "generated", "database.db", "__pycache__") or name.startswith("."):
+            continue
+        os.symlink(os.path.join(ROOT, name), os.path.join(root, name))
+    return root
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in APPS:
+            raise SystemExit(f"unknown app in --mix: {name!r} (choose from {', '.join(APPS)})")
+        mix[name] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--concurrency", default="2,4,8", help="comma-separated client counts, one stage each")
+    ap.add_argument("--duration", type=float, default=30, help="measured seconds per stage")
+    ap.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before each stage")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="app=weight pairs")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    ap.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker (gthread if > 1)")
+    ap.add_argument("--groq-latency", type=float, default=0.8)
+    ap.add_argument("--groq-jitter", type=float, default=0.2)
+    ap.add_argument("--groq-tps", type=float, default=250)
+    ap.add_argument("--groq-tokens", type=int, default=600)
+    ap.add_argument("--groq-max-inflight", type=int, default=0)
+    ap.add_argument("--timeout", type=float, default=120, help="client request timeout")
+    ap.add_argument("--db", help="scratch database path (default: a temp file)")
+    ap.add_argument("--out", help="write the JSON report here")
+    args = ap.parse_args(argv)
+    mix = parse_mix(args.mix)
+    args.metrics_flush = 1.0
+
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    app_root = scratch_root(tmp)
+    args.db = args.db or os.path.join(tmp, "load.db")
+    prepare_database(args.db)
+
+    groq_port, app_port = _free_port(), _free_port()
+    metrics_token = uuid.uuid4().hex
+    groq_url, app_url = f"http://127.0.0.1:{groq_port}", f"http://127.0.0.1:{app_port}"
+    procs = []
+    try:
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "bench", "fake_groq.py"), "--port", str(groq_port),
+             "--latency", str(args.groq_latency), "--jitter", str(args.groq_jitter),
+             "--tps", str(args.groq_tps), "--tokens", str(args.groq_tokens),
+             "--max-inflight", str(args.groq_max_inflight)], cwd=ROOT))
+        _wait_http(groq_url + "/stats", proc=procs[-1])
+
+        env = {**os.environ, "DATABASE_PATH": args.db, "GROQ_BASE_URL": groq_url,
+               "METRICS_ENABLED": "1", "METRICS_FLUSH_SECONDS": str(args.metrics_flush),
+               "METRICS_TOKEN": metrics_token,
+               "SWEEP_INTERVAL_SECONDS": os.environ.get("SWEEP_INTERVAL_SECONDS", "0")}
+        cmd = ["gunicorn", "main:app", "--bind", f"127.0.0.1:{app_port}", "--workers", str(args.workers),
+               "--timeout", str(int(args.timeout)), "--log-level", "warning"]
+        if args.threads > 1:
+            cmd += ["--threads", str(args.threads), "--worker-class", "gthread"]
+        procs.append(subprocess.Popen(cmd, cwd=app_root, env=env))
+        _wait_http(app_url + "/", proc=procs[-1])
+
+        client = Client(app_url, args.timeout, metrics_token)
+        stages = []
+        for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            stage = run_stage(args, client, groq_url, level, mix)
+            print_stage(stage)
+            stages.append(stage)
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {"meta": {"created_at": datetime.utcnow().isoformat(), "mix": mix, "workers": args.workers,
+                       "threads": args.threads, "duration": args.duration, "warmup": args.warmup,
+                       "groq": {"latency": args.groq_latency, "jitter": args.groq_jitter, "tps": args.groq_tps,
+                                "tokens": args.groq_tokens, "max_inflight": args.groq_max_inflight}},
+              "stages": stages}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Benchmark for the gen app's PDF renderers.
+Renders every INTERIOR_TEMPLATES entry x PAPER_SIZES x page count, plus every
+COVER_SCHEMES cover, and records wall time, peak RSS and output bytes. Each
+case runs in a fresh process so peak RSS belongs to that case alone.
+
+    python bench/pdf_bench.py --out bench/results.json
+    python bench/pdf_bench.py --baseline bench/baseline.json     # exit 1 on regression
+    python bench/pdf_bench.py --templates dot_grid,habit_tracker --pages 500 --mode both
+
+Interiors are rendered the way the app does (one Form XObject stamped on every
+page); --mode redraw times draw_interior on every page instead, which is where
+per-template cost shows.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import multiprocessing
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Benchmark the renderers, not the instrumentation around them.
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+PAGE_COUNTS = (1, 120, 500)
+# A case only regresses if it is both this much slower (or bigger) and past
+# the noise floor below.
+TOLERANCE = 0.15
+TIME_FLOOR_SECONDS = 0.005
+RSS_FLOOR_KB = 1024
+
+
+def _rss_kb():
+    """Current resident set size in KB (Linux), else the peak so far."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(case, repeat):
+    """Pool task, one fresh process per case: render it `repeat` times."""
+    from apps.gen.routes import generate_interior_pdf, generate_cover_pdf
+    baseline_rss = _rss_kb()
+    times, size = [], 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "out.pdf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            if case["kind"] == "interior":
+                generate_interior_pdf(case["template"], case["pages"], case["paper_size"],
+                                      reuse_template=case["mode"] == "reuse", out=path)
+            else:
+                generate_cover_pdf("Benchmark Book Title", "A subtitle for measuring",
+                                   "Bench Author", case["template"], "", out=path)
+            times.append(time.perf_counter() - t0)
+            size = os.path.getsize(path)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {**case, "seconds_min": round(min(times), 5), "seconds_median": round(statistics.median(times), 5),
+            "peak_rss_kb": peak, "rss_delta_kb": max(0, peak - baseline_rss), "bytes": size}
+
+
+def build_cases(templates=None, sizes=None, pages=PAGE_COUNTS, modes=("reuse",), covers=True):
+    from apps.gen.routes import INTERIOR_TEMPLATES, PAPER_SIZES, COVER_SCHEMES
+    cases = []
+    for tpl in INTERIOR_TEMPLATES:
+        if templates and tpl["id"] not in templates:
+            continue
+        for size in PAPER_SIZES:
+            if sizes and size not in sizes:
+                continue
+            for n in pages:
+                for mode in modes:
+                    cases.append({"id": f"interior/{tpl['id']}/{size}/{n}/{mode}", "kind": "interior",
+                                  "template": tpl["id"], "paper_size": size, "pages": n, "mode": mode})
+    if covers:
+        for scheme in COVER_SCHEMES:
+            if templates and scheme not in templates:
+                continue
+            cases.append({"id": f"cover/{scheme}", "kind": "cover", "template": scheme})
+    return cases
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(cases, repeat, workers=1):
+    """Run cases, each in its own spawned process. Parallel workers (-j)
+    finish sooner but disturb each other's timings."""
+    import reportlab
+    from apps.gen.cache import RENDERER_VERSION
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    with ctx.Pool(processes=workers, maxtasksperchild=1) as pool:
+        pending = [pool.apply_async(run_case, (case, repeat)) for case in cases]
+        for i, job in enumerate(pending, 1):
+            r = job.get()
+            results.append(r)
+            print(f"[{i}/{len(cases)}] {r['id']:<44} {r['seconds_min'] * 1000:9.1f} ms "
+                  f"{r['rss_delta_kb'] / 1024:7.1f} MB {r['bytes'] / 1024:9.1f} KB", file=sys.stderr)
+    return {"meta": {"created_at": datetime.utcnow().isoformat(), "commit": _git_commit(),
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "reportlab": reportlab.Version, "renderer_version": RENDERER_VERSION,
+                     "repeat": repeat, "workers": workers},
+            "results": results}
+
+
+def compare(current, baseline, tolerance=TOLERANCE):
+    """Regressions of current vs baseline results, matched by case id:
+    a list of {"id", "metric", "baseline", "current", "ratio"}."""
+    before = {r["id"]: r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = before.get(r["id"])
+        if not b:
+            continue
+        for metric, floor in (("seconds_min", TIME_FLOOR_SECONDS), ("rss_delta_kb", RSS_FLOOR_KB), ("bytes", 0)):
+            old, new = b.get(metric), r.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append({"id": r["id"], "metric": metric, "baseline": old, "current": new,
+                                    "ratio": round(new / old, 2) if old else None})
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--out", help="write JSON results here (default: stdout)")
+    ap.add_argument("--baseline", help="JSON results to compare against; exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown/growth (0.15 = 15%%)")
+    ap.add_argument("--templates", help="comma-separated interior template / cover scheme ids")
+    ap.add_argument("--sizes", help="comma-separated paper sizes")
+    ap.add_argument("--pages", default=",".join(map(str, PAGE_COUNTS)), help="comma-separated page counts")
+    ap.add_argument("--mode", choices=("reuse", "redraw", "both"), default="reuse")
+    ap.add_argument("--no-covers", action="store_true")
+    ap.add_argument("--repeat", type=int, default=3, help="renders per case; the fastest is compared")
+    ap.add_argument("-j", "--workers", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    split = lambda s: [x.strip() for x in s.split(",") if x.strip()] if s else None
+    modes = ("reuse", "redraw") if args.mode == "both" else (args.mode,)
+    cases = build_cases(split(args.templates), split(args.sizes), [int(p) for p in split(args.pages)],
+                        modes, covers=not args.no_covers)
+    if not cases:
+        ap.error("no cases match the filters")
+    current = run(cases, max(1, args.repeat), max(1, args.workers))
+
+    text = json.dumps(current, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(current, json.load(f), args.tolerance)
+        for reg in regressions:
+            print(f"REGRESSION {reg['id']} {reg['metric']}: {reg['baseline']} -> {reg['current']} "
+                  f"(x{reg['ratio']})", file=sys.stderr)
+        if regressions:
+            return 1
+        print("no regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,106 +1,425 @@
 """
 Shared file-cleanup utilities for all apps.
-Files (and their DB records) older than TTL_HOURS are deleted on each index page load.
+Files (and their DB records) older than TTL_HOURS are deleted by a background
+sweeper every SWEEP_INTERVAL_SECONDS. Each blueprint registers its purge with
+register_sweep(); a lease row in sweeper_state makes sure only one gunicorn
+worker sweeps per interval.
+Every file written under uploads/ or generated/ is recorded in file_manifest
+with track_file(), so a sweep only looks at expired manifest entries instead
+of listing directories. reconcile_files() catches anything the manifest
+missed (crashes, files from before it existed) and runs far less often, every
+RECONCILE_INTERVAL_HOURS.
 """
 import os
+import time
+import json
+import uuid
+import logging
+import threading
+import multiprocessing
 from datetime import datetime, timedelta
 from db import get_db
+from jobs import JOB_STALE_MINUTES
+from metrics import timed
 
 TTL_HOURS = 1
+SWEEP_INTERVAL_SECONDS = int(os.environ.get("SWEEP_INTERVAL_SECONDS", "300"))
+# Rows deleted per write transaction, and the pause between transactions.
+PURGE_BATCH_ROWS  = int(os.environ.get("PURGE_BATCH_ROWS", "500"))
+PURGE_BATCH_PAUSE = 0.01
+RECONCILE_INTERVAL_HOURS = float(os.environ.get("RECONCILE_INTERVAL_HOURS", "24"))
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+log = logging.getLogger(__name__)
+
+_sweeps = []            # (name, purge_fn, directory)
+_sweeper_started = False
+_sweeper_lock = threading.Lock()
+_worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
 
 
 def _cutoff():
     return (datetime.utcnow() - timedelta(hours=TTL_HOURS)).isoformat()
 
 
+# ── File manifest ───────────────────────────────────────────────
+
+def _manifest_path(path):
+    return os.path.relpath(os.path.abspath(path), ROOT)
+
+
+def track_file(path, size=None, conn=None):
+    """Record a file written under uploads/ or generated/, expiring
+    TTL_HOURS from now. Tracking a path again (e.g. a deduplicated upload)
+    extends its expiry. Pass conn to record it in the caller's transaction;
+    size defaults to the file's current size."""
+    if size is None:
+        size = os.path.getsize(path)
+    now = datetime.utcnow()
+    own = conn is None
+    conn = conn or get_db()
+    conn.execute("INSERT OR REPLACE INTO file_manifest (path, size, expires_at, created_at) VALUES (?,?,?,?)",
+                 (_manifest_path(path), size, (now + timedelta(hours=TTL_HOURS)).isoformat(), now.isoformat()))
+    if own:
+        conn.commit()
+        conn.close()
+
+
+def untrack_file(path, conn=None):
+    """Forget a file that was deleted outside the sweeper."""
+    own = conn is None
+    conn = conn or get_db()
+    conn.execute("DELETE FROM file_manifest WHERE path=?", (_manifest_path(path),))
+    if own:
+        conn.commit()
+        conn.close()
+
+
+@timed("legal.purge_uploads")
 def purge_legal_uploads(upload_dir):
-    """Delete legal uploaded documents older than TTL_HOURS."""
+    """Delete legal uploaded documents older than TTL_HOURS.
+    Uploads are content-addressed, so a blob is only deleted once no live
+    document references it."""
     cutoff = _cutoff()
-    conn = get_db()
-    expired = conn.execute(
-        "SELECT id, filename FROM legal_documents WHERE created_at < ?", (cutoff,)
-    ).fetchall()
-    for row in expired:
-        _rm(os.path.join(upload_dir, row["filename"]))
-        conn.execute("DELETE FROM legal_analyses WHERE doc_id=?", (row["id"],))
-        conn.execute("DELETE FROM legal_documents WHERE id=?", (row["id"],))
-    # Also remove any orphaned files not tracked in the DB
-    _purge_orphans(upload_dir, {r["filename"] for r in conn.execute(
-        "SELECT filename FROM legal_documents").fetchall()})
-    conn.commit()
-    conn.close()
+    # Documents still in the async pipeline (POST /legal/jobs) whose job was lost.
+    report = _fail_stale_jobs("legal_documents", ("queued", "extracting", "extracted", "analysing"),
+                              error="Analysis was interrupted. Please try again.",
+                              since="status_updated_at")
+    _merge(report, _purge_expired("legal_documents", cutoff, children=(("legal_analyses", "doc_id"),),
+                                  file_col="filename", directory=upload_dir, shared_files=True))
+    # Extracted text is contract content too; it expires with the uploads.
+    _merge(report, _purge_expired("legal_texts", cutoff, key="file_hash"))
+    _merge(report, _purge_manifest(upload_dir))
+    _merge(report, _purge_stale(os.path.join(upload_dir, "tmp")))
+    return report
+
+
+@timed("legal.purge_reports")
+def purge_legal_reports(gen_dir):
+    """Delete cached legal PDF reports (<analysis_id>-<version>.pdf) older
+    than TTL_HOURS. A report is rendered after its analysis, so it never
+    outlives the analysis by more than TTL_HOURS, and a purged report is
+    simply rendered again if its analysis is still live."""
+    report = _purge_manifest(gen_dir)
+    return _merge(report, _purge_stale(os.path.join(gen_dir, "tmp")))
 
 
+@timed("gen.purge")
 def purge_gen_files(gen_dir):
     """Delete gen-app generated PDFs older than TTL_HOURS."""
-    cutoff = _cutoff()
-    conn = get_db()
-    expired = conn.execute(
-        "SELECT id, out_file FROM gen_projects WHERE created_at < ?", (cutoff,)
-    ).fetchall()
-    for row in expired:
-        _rm(os.path.join(gen_dir, row["out_file"]))
-        conn.execute("DELETE FROM gen_projects WHERE id=?", (row["id"],))
-    # Also remove orphaned files not tracked in the DB
-    _purge_orphans(gen_dir, {r["out_file"] for r in conn.execute(
-        "SELECT out_file FROM gen_projects").fetchall()})
-    conn.commit()
-    conn.close()
+    report = _fail_stale_jobs("gen_projects", ("pending", "running"), since="status_updated_at")
+    _merge(report, _purge_expired("gen_projects", _cutoff(), file_col="out_file", directory=gen_dir))
+    # Also remove files whose project row was never written (failed renders)
+    _merge(report, _purge_manifest(gen_dir))
+    # and partial renders left in tmp/ by a crashed worker.
+    return _merge(report, _purge_stale(os.path.join(gen_dir, "tmp")))
 
 
+@timed("optimizer.purge")
 def purge_optimizer_files(gen_dir):
     """Delete optimizer-app generated TXT exports older than TTL_HOURS."""
-    cutoff = _cutoff()
-    conn = get_db()
-    expired = conn.execute(
-        "SELECT id FROM opt_projects WHERE created_at < ?", (cutoff,)
-    ).fetchall()
-    for row in expired:
-        conn.execute("DELETE FROM opt_projects WHERE id=?", (row["id"],))
-    conn.commit()
-    conn.close()
-    _purge_orphans(gen_dir, set())
+    report = _purge_expired("opt_projects", _cutoff())
+    return _merge(report, _purge_manifest(gen_dir))
 
 
+@timed("bulk.purge")
 def purge_bulk_files(gen_dir):
     """Delete bulk-app generated CSV files older than TTL_HOURS."""
-    cutoff = _cutoff()
-    conn = get_db()
-    expired_batches = conn.execute(
-        "SELECT id FROM bulk_batches WHERE created_at < ?", (cutoff,)
-    ).fetchall()
-    for row in expired_batches:
-        conn.execute("DELETE FROM bulk_books WHERE batch_id=?", (row["id"],))
-        conn.execute("DELETE FROM bulk_batches WHERE id=?", (row["id"],))
-    conn.commit()
-    conn.close()
-    _purge_orphans(gen_dir, set())
+    # Streams (/bulk/generate-stream) whose worker died before finishing.
+    report = _fail_stale_jobs("bulk_batches", ("running",))
+    _merge(report, _purge_expired("bulk_batches", _cutoff(), children=(("bulk_books", "batch_id"),)))
+    return _merge(report, _purge_manifest(gen_dir))
 
 
+@timed("finder.purge")
 def purge_finder_files(gen_dir):
     """Delete finder-app saved searches older than TTL_HOURS."""
-    cutoff = _cutoff()
+    report = _purge_expired("finder_searches", _cutoff())
+    return _merge(report, _purge_manifest(gen_dir))
+
+
+# ── Purge helpers ───────────────────────────────────────────────
+
+def _report():
+    return {"rows": 0, "files": 0, "bytes": 0}
+
+
+def _merge(report, other):
+    for k, v in other.items():
+        report[k] = report.get(k, 0) + v
+    return report
+
+
+def _tally(report, size):
+    """Count one _rm() result into report."""
+    if size is not None:
+        report["files"] += 1
+        report["bytes"] += size
+
+
+def _purge_expired(table, cutoff, children=(), file_col=None, directory=None,
+                   shared_files=False, key="id"):
+    """Set-based purge of table rows created before cutoff, PURGE_BATCH_ROWS
+    per write transaction so no single purge holds the write lock for long.
+    children are (table, column) pairs referencing table.key, deleted with it.
+    file_col names a file in directory to delete with its row; with
+    shared_files a file is only deleted once no remaining row references it,
+    checked under the same write lock so nothing can start referencing it
+    in between. Returns {"rows", "files", "bytes"}."""
+    report = _report()
+    cols = key + (f", {file_col}" if file_col else "")
     conn = get_db()
-    conn.execute("DELETE FROM finder_searches WHERE created_at < ?", (cutoff,))
-    conn.commit()
-    conn.close()
-    _purge_orphans(gen_dir, set())
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            batch = conn.execute(
+                f"SELECT {cols} FROM {table} WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                (cutoff, PURGE_BATCH_ROWS)).fetchall()
+            if not batch:
+                conn.commit()
+                break
+            keys = [r[key] for r in batch]
+            marks = ",".join("?" * len(keys))
+            for child, column in children:
+                report["rows"] += conn.execute(
+                    f"DELETE FROM {child} WHERE {column} IN ({marks})", keys).rowcount
+            report["rows"] += conn.execute(
+                f"DELETE FROM {table} WHERE {key} IN ({marks})", keys).rowcount
+            names = {r[file_col] for r in batch if r[file_col]} if file_col else set()
+            if shared_files and names:
+                names -= {r[0] for r in conn.execute(
+                    f"SELECT DISTINCT {file_col} FROM {table} WHERE {file_col} IN "
+                    f"({','.join('?' * len(names))})", list(names)).fetchall()}
+            for name in names:
+                _tally(report, _rm(os.path.join(directory, name)))
+            if names:
+                paths = [_manifest_path(os.path.join(directory, name)) for name in names]
+                conn.execute(f"DELETE FROM file_manifest WHERE path IN ({','.join('?' * len(paths))})", paths)
+            conn.commit()
+            if len(batch) < PURGE_BATCH_ROWS:
+                break
+            # Let writers waiting on busy_timeout in before the next batch.
+            time.sleep(PURGE_BATCH_PAUSE)
+    finally:
+        conn.close()
+    return report
+
+
+def _fail_stale_jobs(table, statuses, error=None, since="created_at"):
+    """Mark rows whose background job has sat in one of statuses for more
+    than JOB_STALE_MINUTES as failed. Job pools are per process, so a job
+    lost to a worker restart would otherwise leave its row unfinished for
+    good. since is the column holding when the row entered its status (it is
+    updated too if it is not created_at); error, if given, is stored in the
+    row's error column."""
+    cutoff = (datetime.utcnow() - timedelta(minutes=JOB_STALE_MINUTES)).isoformat()
+    marks = ",".join("?" * len(statuses))
+    sets, params = ["status='failed'"], []
+    if error is not None:
+        sets.append("error=?")
+        params.append(error)
+    if since != "created_at":
+        sets.append(f"{since}=?")
+        params.append(datetime.utcnow().isoformat())
+    conn = get_db()
+    try:
+        cur = conn.execute(f"UPDATE {table} SET {', '.join(sets)} WHERE status IN ({marks}) AND {since} < ?",
+                           (*params, *statuses, cutoff))
+        conn.commit()
+    finally:
+        conn.close()
+    return {"jobs_failed": cur.rowcount}
 
 
 def _rm(path):
-    """Silently remove a file if it exists."""
+    """Silently remove a file if it exists. Returns its size if removed, else None."""
     try:
-        if os.path.exists(path):
-            os.remove(path)
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
     except OSError:
-        pass
+        return None
 
 
-def _purge_orphans(directory, known_filenames):
-    """Remove any files in directory that are not in known_filenames."""
+def _purge_stale(directory):
+    """Remove files in directory last modified more than TTL_HOURS ago
+    (e.g. partial uploads left behind by a crashed worker)."""
+    report = {"files": 0, "bytes": 0}
+    limit = time.time() - TTL_HOURS * 3600
     try:
-        for fname in os.listdir(directory):
-            if fname not in known_filenames:
-                _rm(os.path.join(directory, fname))
+        with os.scandir(directory) as it:
+            for e in it:
+                if e.is_file() and e.stat().st_mtime < limit:
+                    _tally(report, _rm(e.path))
     except OSError:
         pass
+    return report
+
+
+def _purge_manifest(directory):
+    """Delete files in directory whose manifest entry has expired: an index
+    range scan over expired entries, PURGE_BATCH_ROWS per write transaction.
+    Entries are re-read under the write lock, so a file whose expiry was
+    just extended is left alone."""
+    report = {"files": 0, "bytes": 0}
+    prefix = _manifest_path(directory) + os.sep
+    conn = get_db()
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            # path >= prefix AND path < prefix-with-next-separator: entries in directory
+            batch = [r["path"] for r in conn.execute(
+                """SELECT path FROM file_manifest
+                   WHERE expires_at < ? AND path >= ? AND path < ?
+                   ORDER BY expires_at LIMIT ?""",
+                (datetime.utcnow().isoformat(), prefix, prefix[:-1] + chr(ord(os.sep) + 1),
+                 PURGE_BATCH_ROWS)).fetchall()]
+            for path in batch:
+                _tally(report, _rm(os.path.join(ROOT, path)))
+            if batch:
+                conn.execute(f"DELETE FROM file_manifest WHERE path IN ({','.join('?' * len(batch))})", batch)
+            conn.commit()
+            if len(batch) < PURGE_BATCH_ROWS:
+                break
+            time.sleep(PURGE_BATCH_PAUSE)
+    finally:
+        conn.close()
+    return report
+
+
+def _reconcile_directory(conn, directory):
+    """Make one directory and its manifest entries agree: delete untracked
+    files older than TTL_HOURS and drop entries whose file is gone.
+    Subdirectories (tmp/, the gen artifact cache) manage their own lifetime."""
+    report = {"files": 0, "bytes": 0, "entries": 0}
+    prefix = _manifest_path(directory) + os.sep
+    tracked = {r["path"] for r in conn.execute(
+        "SELECT path FROM file_manifest WHERE path >= ? AND path < ?",
+        (prefix, prefix[:-1] + chr(ord(os.sep) + 1))).fetchall()}
+    limit = time.time() - TTL_HOURS * 3600
+    present = set()
+    try:
+        with os.scandir(directory) as it:
+            for e in it:
+                if not e.is_file():
+                    continue
+                path = _manifest_path(e.path)
+                present.add(path)
+                if path not in tracked and e.stat().st_mtime < limit:
+                    _tally(report, _rm(e.path))
+    except OSError:
+        return report
+    gone = [p for p in tracked if p not in present and not os.path.exists(os.path.join(ROOT, p))]
+    for i in range(0, len(gone), PURGE_BATCH_ROWS):
+        chunk = gone[i:i + PURGE_BATCH_ROWS]
+        report["entries"] += conn.execute(
+            f"DELETE FROM file_manifest WHERE path IN ({','.join('?' * len(chunk))})", chunk).rowcount
+        conn.commit()
+    return report
+
+
+@timed("cleanup.reconcile")
+def reconcile_files():
+    """Full directory-vs-manifest reconcile of every registered directory.
+    Cost scales with the total number of files, so it is a maintenance task
+    run every RECONCILE_INTERVAL_HOURS, not part of the regular sweep."""
+    started = time.monotonic()
+    report = {"started_at": datetime.utcnow().isoformat(), "apps": {}}
+    conn = get_db()
+    try:
+        for name, _purge_fn, directory in _sweeps:
+            try:
+                report["apps"][name] = _reconcile_directory(conn, directory)
+            except Exception as e:
+                log.exception("cleanup: %s reconcile failed", name)
+                report["apps"][name] = {"error": str(e)}
+    finally:
+        conn.close()
+    report["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return report
+
+
+# ── Background sweeper ──────────────────────────────────────────
+
+def register_sweep(name, purge_fn, directory):
+    """Have the background sweeper call purge_fn(directory) every interval."""
+    _sweeps.append((name, purge_fn, directory))
+
+
+def sweep_all():
+    """Run every registered purge now. Returns a report of counts and timings."""
+    started = time.monotonic()
+    report = {"started_at": datetime.utcnow().isoformat(), "apps": {}}
+    for name, purge_fn, directory in _sweeps:
+        t0 = time.monotonic()
+        try:
+            result = purge_fn(directory) or {}
+        except Exception as e:
+            log.exception("cleanup: %s purge failed", name)
+            result = {"error": str(e)}
+        result["duration_ms"] = round((time.monotonic() - t0) * 1000, 1)
+        report["apps"][name] = result
+    report["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return report
+
+
+def _acquire_lease(name="cleanup", interval=None):
+    """Claim this interval's run of task `name`. Only one process wins until
+    next_run_at passes, and a crashed sweeper simply lets the lease expire."""
+    interval = SWEEP_INTERVAL_SECONDS if interval is None else interval
+    now = datetime.utcnow()
+    conn = get_db()
+    conn.execute("INSERT OR IGNORE INTO sweeper_state (name, next_run_at) VALUES (?, '')", (name,))
+    won = conn.execute(
+        "UPDATE sweeper_state SET next_run_at=?, holder=? WHERE name=? AND next_run_at <= ?",
+        ((now + timedelta(seconds=interval)).isoformat(), _worker_id, name, now.isoformat())
+    ).rowcount == 1
+    conn.commit()
+    conn.close()
+    return won
+
+
+def _record_report(report, name="cleanup"):
+    conn = get_db()
+    conn.execute("UPDATE sweeper_state SET last_report=? WHERE name=?", (json.dumps(report), name))
+    conn.commit()
+    conn.close()
+
+
+def last_sweep_report(name="cleanup"):
+    """The most recent sweep (or, with name="reconcile", reconcile) report
+    from any worker, or None."""
+    conn = get_db()
+    row = conn.execute("SELECT last_report FROM sweeper_state WHERE name=?", (name,)).fetchone()
+    conn.close()
+    return json.loads(row["last_report"]) if row and row["last_report"] else None
+
+
+def _sweeper_loop():
+    while True:
+        try:
+            if _acquire_lease():
+                report = sweep_all()
+                _record_report(report)
+                log.info("cleanup: swept in %sms %s", report["duration_ms"], report["apps"])
+            if RECONCILE_INTERVAL_HOURS > 0 and _acquire_lease("reconcile", RECONCILE_INTERVAL_HOURS * 3600):
+                report = reconcile_files()
+                _record_report(report, "reconcile")
+                log.info("cleanup: reconciled in %sms %s", report["duration_ms"], report["apps"])
+        except Exception:
+            log.exception("cleanup: sweep failed")
+        time.sleep(SWEEP_INTERVAL_SECONDS)
+
+
+def start_sweeper():
+    """Start the background sweeper thread once per web process."""
+    global _sweeper_started
+    # Job-pool children re-import the app; they must not sweep.
+    if multiprocessing.parent_process() is not None:
+        return
+    with _sweeper_lock:
+        if _sweeper_started or SWEEP_INTERVAL_SECONDS <= 0:
+            return
+        _sweeper_started = True
+    threading.Thread(target=_sweeper_loop, name="cleanup-sweeper", daemon=True).start()
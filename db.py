@@ -1,16 +1,100 @@
 import sqlite3
 import os
+import json
+import time
+import base64
+import threading
 
-DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.db")
+from metrics import timed
 
+# DATABASE_PATH points a run (e.g. bench/load_test.py) at a scratch database.
+DATABASE = os.environ.get("DATABASE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.db")
 
-def get_db():
-    conn = sqlite3.connect(DATABASE)
+# Applied once when a pooled connection is created.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-8000",        # 8 MB page cache
+    "PRAGMA mmap_size=67108864",      # 64 MB memory-mapped I/O
+)
+
+# How often a process re-checks settings_versions for changes made by
+# another gunicorn worker. Changes in this process are visible immediately.
+SETTINGS_RECHECK_SECONDS = 5
+
+_local = threading.local()
+_settings_cache = {}   # table -> (version, checked_at, {key: value})
+
+
+class PooledConnection(sqlite3.Connection):
+    """A connection that stays open for reuse by its thread.
+    close() only discards uncommitted work, like a real close would, and
+    only for the outermost get_db() caller: a helper that gets and closes the
+    connection inside a caller's open transaction leaves it alone. (Helpers
+    that write still commit it; pass them conn= where they take one.)"""
+
+    _depth = 0   # get_db() callers that have not closed yet
+
+    def close(self):
+        self._depth = max(0, self._depth - 1)
+        if self._depth == 0 and self.in_transaction:
+            self.rollback()
+
+    def release(self):
+        """End of a request or job: discard uncommitted work whoever owns it."""
+        self._depth = 0
+        if self.in_transaction:
+            self.rollback()
+
+
+def _connect():
+    conn = sqlite3.connect(DATABASE, factory=PooledConnection)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+@timed("db.get_db")
+def get_db():
+    """Return this thread's pooled connection, opening it on first use.
+    Callers may keep calling conn.close() when done; see PooledConnection
+    for what that does inside another caller's transaction."""
+    conn = getattr(_local, "conn", None)
+    # A connection inherited across fork() must not be shared with the parent.
+    if conn is None or _local.pid != os.getpid():
+        conn = _connect()
+        _local.conn, _local.pid = conn, os.getpid()
+    # With no transaction open there is no outer caller to protect, so a
+    # count left high by callers that never closed starts over here.
+    if not conn.in_transaction:
+        conn._depth = 0
+    conn._depth += 1
+    return conn
+
+
+def close_db(exc=None):
+    """App-context teardown: never leave a request's transaction open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.release()
+
+
+def drop_db():
+    """Really close this thread's pooled connection. For threads that end
+    with their task (a per-request executor), whose connection would
+    otherwise stay open until garbage collection."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        _local.conn = None
+        sqlite3.Connection.close(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
+
 def init_db():
     conn = get_db()
     c = conn.cursor()
@@ -28,6 +112,10 @@ def init_db():
         id TEXT PRIMARY KEY, content_id TEXT, reason TEXT,
         description TEXT, status TEXT DEFAULT 'pending',
         created_at TEXT, reviewed_at TEXT, admin_note TEXT)""")
+    # Extracted document text by file sha256 (see apps/legal/extract.py).
+    # complete=0 means extraction stopped early at a character budget.
+    c.execute("""CREATE TABLE IF NOT EXISTS legal_texts (
+        file_hash TEXT PRIMARY KEY, text TEXT, complete INTEGER, created_at TEXT)""")
 
     # ── GEN ────────────────────────────────────────────────────────
     c.execute("""CREATE TABLE IF NOT EXISTS gen_projects (
@@ -82,19 +170,236 @@ def init_db():
         description TEXT, status TEXT DEFAULT 'pending',
         created_at TEXT, reviewed_at TEXT, admin_note TEXT)""")
 
+    # ── SHARED ─────────────────────────────────────────────────────
+    # Bumped by set_setting so other processes know to reload a *_settings table.
+    c.execute("""CREATE TABLE IF NOT EXISTS settings_versions (
+        tbl TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)""")
+
+    # Background cleanup lease and last report (see cleanup.start_sweeper).
+    c.execute("""CREATE TABLE IF NOT EXISTS sweeper_state (
+        name TEXT PRIMARY KEY, next_run_at TEXT, holder TEXT, last_report TEXT)""")
+
+    # Shared LLM response cache (see llm.chat_json).
+    c.execute("""CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY, response TEXT, created_at TEXT)""")
+
+    # Every file written under uploads/ and generated/, with its expiry
+    # (see cleanup.track_file). path is relative to the project root.
+    c.execute("""CREATE TABLE IF NOT EXISTS file_manifest (
+        path TEXT PRIMARY KEY, size INTEGER, expires_at TEXT, created_at TEXT)""")
+
+    # Latest latency histograms of each process (see metrics.flush).
+    c.execute("""CREATE TABLE IF NOT EXISTS metrics_snapshots (
+        process TEXT PRIMARY KEY, data TEXT, updated_at TEXT)""")
+
     conn.commit()
+    migrate(conn)
     conn.close()
 
 
-def get_setting(table, key, default=""):
+# Schema changes after the base tables above. Each entry is applied once, in
+# order, and PRAGMA user_version records the last one applied. Never edit a
+# released entry — append a new one.
+MIGRATIONS = [
+    (1, "indexes for history ordering, TTL purges and foreign-key lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_legal_documents_created ON legal_documents(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_legal_analyses_doc ON legal_analyses(doc_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_gen_projects_created ON gen_projects(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_opt_projects_created ON opt_projects(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_bulk_batches_created ON bulk_batches(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_bulk_books_batch ON bulk_books(batch_id)",
+        "CREATE INDEX IF NOT EXISTS idx_finder_searches_created ON finder_searches(created_at, id, seed_topic)",
+        "CREATE INDEX IF NOT EXISTS idx_legal_reports_created ON legal_reports(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_gen_reports_created ON gen_reports(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_opt_reports_created ON opt_reports(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_bulk_reports_created ON bulk_reports(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_finder_reports_created ON finder_reports(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)",
+    ]),
+    (2, "(created_at, id) keyset indexes for paginated histories and reports", [
+        "DROP INDEX IF EXISTS idx_legal_documents_created",
+        "CREATE INDEX IF NOT EXISTS idx_legal_documents_page ON legal_documents(created_at, id)",
+        "DROP INDEX IF EXISTS idx_gen_projects_created",
+        "CREATE INDEX IF NOT EXISTS idx_gen_projects_page ON gen_projects(created_at, id)",
+        "DROP INDEX IF EXISTS idx_opt_projects_created",
+        "CREATE INDEX IF NOT EXISTS idx_opt_projects_page ON opt_projects(created_at, id)",
+        "DROP INDEX IF EXISTS idx_bulk_batches_created",
+        "CREATE INDEX IF NOT EXISTS idx_bulk_batches_page ON bulk_batches(created_at, id)",
+    ] + [stmt for app in ("legal", "gen", "opt", "bulk", "finder") for stmt in (
+        f"DROP INDEX IF EXISTS idx_{app}_reports_created",
+        f"CREATE INDEX IF NOT EXISTS idx_{app}_reports_page ON {app}_reports(created_at, id)",
+        f"CREATE INDEX IF NOT EXISTS idx_{app}_reports_status ON {app}_reports(status, created_at, id)",
+    )]),
+    (3, "TTL purge index for the legal text cache", [
+        "CREATE INDEX IF NOT EXISTS idx_legal_texts_created ON legal_texts(created_at)",
+    ]),
+    (4, "content-addressed legal uploads", [
+        "ALTER TABLE legal_documents ADD COLUMN file_hash TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_legal_documents_hash ON legal_documents(file_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_legal_documents_file ON legal_documents(filename)",
+    ]),
+    (5, "failure reason for the async legal pipeline", [
+        "ALTER TABLE legal_documents ADD COLUMN error TEXT",
+    ]),
+    (6, "expiry index for the file manifest", [
+        "CREATE INDEX IF NOT EXISTS idx_file_manifest_expires ON file_manifest(expires_at, path)",
+    ]),
+    (7, "(created_at, id) keyset index for finder search history", [
+        "DROP INDEX IF EXISTS idx_finder_searches_created",
+        "CREATE INDEX IF NOT EXISTS idx_finder_searches_page ON finder_searches(created_at, id)",
+    ]),
+    (8, "status change time for the async legal pipeline", [
+        "ALTER TABLE legal_documents ADD COLUMN status_updated_at TEXT",
+        "UPDATE legal_documents SET status_updated_at=created_at",
+        "CREATE INDEX IF NOT EXISTS idx_legal_documents_status ON legal_documents(status, status_updated_at)",
+    ]),
+    (9, "status change time for background gen renders", [
+        "ALTER TABLE gen_projects ADD COLUMN status_updated_at TEXT",
+        "UPDATE gen_projects SET status_updated_at=created_at",
+        "CREATE INDEX IF NOT EXISTS idx_gen_projects_status ON gen_projects(status, status_updated_at)",
+    ]),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending MIGRATIONS. Safe for every gunicorn worker to call at
+    startup: the version is re-read under a write lock, so each migration
+    runs exactly once."""
+    latest = MIGRATIONS[-1][0]
+    if schema_version(conn) >= latest:
+        return latest
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = schema_version(conn)
+        for version, _description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version={int(version)}")
+            current = version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return current
+
+
+# Keyset pagination for history / report lists. Pages are ordered newest
+# first by (created_at, id) and continue from an opaque cursor, so every page
+# is an index range scan no matter how deep the client has scrolled.
+PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """(created_at, id) from a cursor token, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        return None
+    return created_at, row_id
+
+
+def list_page(conn, args, source, fields, default_fields=None,
+              where=None, params=(), key=""):
+    """One page of a list endpoint, driven by the request's query args:
+      ?cursor=  next_cursor from the previous page
+      ?limit=   page size, capped at MAX_PAGE_SIZE
+      ?fields=  comma-separated subset of `fields` for a lean response
+    fields is a tuple of column names, or a dict of name -> SQL expression when
+    source is a join; key prefixes the keyset columns in that case (e.g. "d.").
+    Returns ({"items": [...], "next_cursor": token or None}, err)."""
+    fields = fields if isinstance(fields, dict) else {f: f for f in fields}
+    names = [f.strip() for f in (args.get("fields") or "").split(",") if f.strip()]
+    names = names or list(default_fields or fields)
+    unknown = [n for n in names if n not in fields]
+    if unknown:
+        return None, f"Unknown field(s): {', '.join(unknown)}"
+    # id and created_at make up the cursor, so they are always returned.
+    names += [n for n in ("id", "created_at") if n not in names]
+    try:
+        limit = max(1, min(int(args.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return None, "limit must be a number"
+
+    clauses, values = ([where] if where else []), list(params)
+    if args.get("cursor"):
+        cursor = decode_cursor(args["cursor"])
+        if cursor is None:
+            return None, "Invalid cursor"
+        clauses.append(f"({key}created_at, {key}id) < (?, ?)")
+        values += cursor
+    columns = ", ".join(n if fields[n] == n else f"{fields[n]} AS {n}" for n in names)
+    sql = f"SELECT {columns} FROM {source}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {key}created_at DESC, {key}id DESC LIMIT ?"
+    rows = conn.execute(sql, values + [limit + 1]).fetchall()
+
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"])
+    return {"items": items, "next_cursor": next_cursor}, None
+
+
+REPORT_FIELDS = ("id", "content_id", "reason", "description", "status",
+                 "created_at", "reviewed_at", "admin_note")
+
+
+def report_page(conn, args, table):
+    """list_page over a *_reports table, optionally filtered by ?status=.
+    The first page also carries the number of pending reports."""
+    status = args.get("status")
+    page, err = list_page(conn, args, table, REPORT_FIELDS,
+                          where="status=?" if status else None,
+                          params=(status,) if status else ())
+    if page is not None and not args.get("cursor"):
+        page["pending"] = conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE status='pending'").fetchone()[0]
+    return page, err
+
+
+def _load_settings(table):
+    """Return the cached {key: value} dict for a *_settings table."""
+    checked = time.monotonic()
+    entry = _settings_cache.get(table)
+    if entry and checked - entry[1] < SETTINGS_RECHECK_SECONDS:
+        return entry[2]
     conn = get_db()
-    row = conn.execute(f"SELECT value FROM {table} WHERE key=?", (key,)).fetchone()
+    row = conn.execute("SELECT version FROM settings_versions WHERE tbl=?", (table,)).fetchone()
+    version = row["version"] if row else 0
+    if entry and entry[0] == version:
+        values = entry[2]
+    else:
+        values = {r["key"]: r["value"] for r in conn.execute(f"SELECT key, value FROM {table}")}
     conn.close()
-    return row["value"] if row else default
+    _settings_cache[table] = (version, checked, values)
+    return values
+
+
+def get_setting(table, key, default=""):
+    return _load_settings(table).get(key, default)
 
 
 def set_setting(table, key, value):
     conn = get_db()
     conn.execute(f"INSERT OR REPLACE INTO {table} (key, value) VALUES (?,?)", (key, value))
+    conn.execute("""INSERT INTO settings_versions (tbl, version) VALUES (?, 1)
+                    ON CONFLICT(tbl) DO UPDATE SET version=version+1""", (table,))
     conn.commit()
     conn.close()
+    _settings_cache.pop(table, None)
@@ -0,0 +1,87 @@
+"""
+Shared background job pools for all apps.
+Long-running, CPU-bound work (PDF rendering, text extraction) is handed to a
+process pool so the gunicorn request worker returns immediately and the work
+runs on other cores. Slow I/O-bound work (LLM calls) goes to a thread pool in
+the web process via submit_io(). Job state is tracked in each app's own table
+(e.g. gen_projects.status), so any worker process can answer status requests.
+The pools live in the process that submitted the job, so a job dies with its
+worker; the cleanup sweeper fails rows left unfinished after JOB_STALE_MINUTES.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "0")) or max(1, min(4, os.cpu_count() or 1))
+JOB_IO_WORKERS = int(os.environ.get("JOB_IO_WORKERS", "8"))
+# A job still unfinished this long after its row was created is assumed lost
+# (its worker restarted) and marked failed.
+JOB_STALE_MINUTES = float(os.environ.get("JOB_STALE_MINUTES", "15"))
+
+_pool = None
+_io_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's job pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the web process may already be running threads.
+            _pool = ProcessPoolExecutor(max_workers=JOB_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def get_io_pool():
+    """Return this process's thread pool for I/O-bound jobs."""
+    global _io_pool
+    with _pool_lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=JOB_IO_WORKERS, thread_name_prefix="io-job")
+        return _io_pool
+
+
+def _add_callbacks(future, on_error, on_success):
+    if on_error is None and on_success is None:
+        return
+
+    def _done(f):
+        exc = f.exception()
+        if exc is not None:
+            if on_error is not None:
+                on_error(exc)
+        elif on_success is not None:
+            try:
+                on_success(f.result())
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+    future.add_done_callback(_done)
+
+
+def submit(fn, *args, on_error=None, on_success=None):
+    """Run fn(*args) in the job pool.
+    on_error(exc) is called in this process if the job raises or the pool dies;
+    on_success(result) is called in this process when it finishes, e.g. to
+    enqueue the next stage of a pipeline."""
+    global _pool
+    try:
+        future = get_pool().submit(fn, *args)
+    except RuntimeError:
+        # Pool is broken (a child was killed) — start a fresh one and retry once.
+        with _pool_lock:
+            _pool = None
+        future = get_pool().submit(fn, *args)
+    _add_callbacks(future, on_error, on_success)
+    return future
+
+
+def submit_io(fn, *args, on_error=None, on_success=None):
+    """Like submit(), but runs fn(*args) on a thread of this process. For jobs
+    that mostly wait on the network, so they don't tie up a render worker."""
+    future = get_io_pool().submit(fn, *args)
+    _add_callbacks(future, on_error, on_success)
+    return future
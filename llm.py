@@ -0,0 +1,280 @@
+"""
+Shared Groq access for all apps.
+One client per API key per process, so every optimize / search / analyze /
+bulk call reuses the same keep-alive HTTP connection pool instead of paying
+for a fresh TLS handshake. Point GROQ_BASE_URL at a local Groq-compatible
+server to run the apps without the real API.
+chat_json() adds a SQLite-backed response cache on top for repeated prompts.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import groq
+
+from db import get_db
+from metrics import span
+
+MODEL = "llama-3.3-70b-versatile"
+
+GROQ_BASE_URL        = os.environ.get("GROQ_BASE_URL") or None
+GROQ_TIMEOUT         = float(os.environ.get("GROQ_TIMEOUT", "60"))
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("GROQ_CONNECT_TIMEOUT", "10"))
+GROQ_MAX_RETRIES     = int(os.environ.get("GROQ_MAX_RETRIES", "2"))
+GROQ_MAX_CONNECTIONS = int(os.environ.get("GROQ_MAX_CONNECTIONS", "20"))
+GROQ_MAX_KEEPALIVE   = int(os.environ.get("GROQ_MAX_KEEPALIVE", "10"))
+
+# Identical prompts (double-clicks, re-run finder topics) are answered from
+# llm_cache. LLM_CACHE_TTL_HOURS=0 disables the cache.
+LLM_CACHE_TTL_HOURS   = float(os.environ.get("LLM_CACHE_TTL_HOURS", "24"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "2000"))
+
+# Keys only change from the admin panels, so a handful of clients is plenty.
+MAX_CLIENTS = 8
+
+_clients = OrderedDict()   # api_key -> groq.Groq
+_clients_pid = os.getpid()
+_clients_lock = threading.Lock()
+
+
+def _build_client(api_key):
+    import httpx
+    http_client = groq.DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS,
+                            max_keepalive_connections=GROQ_MAX_KEEPALIVE),
+        timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+    )
+    return groq.Groq(api_key=api_key, base_url=GROQ_BASE_URL,
+                     timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+                     max_retries=GROQ_MAX_RETRIES, http_client=http_client)
+
+
+def get_client(api_key):
+    """Return the process-wide Groq client for api_key, or None without a key."""
+    global _clients_pid
+    if not api_key:
+        return None
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            # Never share connection pools with a parent across fork().
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(api_key)
+        if client is None:
+            client = _build_client(api_key)
+            _clients[api_key] = client
+            # Old clients are dropped, not closed: a request may still be using one.
+            while len(_clients) > MAX_CLIENTS:
+                _clients.popitem(last=False)
+        else:
+            _clients.move_to_end(api_key)
+        return client
+
+
+# ── Response cache ──────────────────────────────────────────────
+
+def _cache_key(model, system, prompt, temperature, max_tokens):
+    payload = json.dumps([model, system, prompt, temperature, max_tokens], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cutoff():
+    return (datetime.utcnow() - timedelta(hours=LLM_CACHE_TTL_HOURS)).isoformat()
+
+
+def cache_get(key):
+    if LLM_CACHE_TTL_HOURS <= 0:
+        return None
+    conn = get_db()
+    row = conn.execute("SELECT response FROM llm_cache WHERE key=? AND created_at >= ?",
+                       (key, _cutoff())).fetchone()
+    conn.close()
+    return row["response"] if row else None
+
+
+def cache_put(key, response):
+    if LLM_CACHE_TTL_HOURS <= 0:
+        return
+    conn = get_db()
+    conn.execute("INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?,?,?)",
+                 (key, response, datetime.utcnow().isoformat()))
+    conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (_cutoff(),))
+    conn.execute("""DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)""",
+                 (LLM_CACHE_MAX_ENTRIES,))
+    conn.commit()
+    conn.close()
+
+
+def parse_json_reply(raw):
+    """Parse a model reply as JSON, tolerating a ```json fenced block."""
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.split("```")[1]
+        if raw.startswith("json"):
+            raw = raw[4:]
+    return json.loads(raw)
+
+
+class RateLimiter:
+    """Token bucket for model calls made from this process: up to `burst`
+    calls at once, refilled at `per_minute`. per_minute <= 0 disables it."""
+
+    def __init__(self, per_minute, burst=1):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+def chat_json(client, system, prompt, max_tokens, temperature, expect=dict, limiter=None):
+    """Ask the model for a JSON reply and parse it, going through the response cache.
+    Raises json.JSONDecodeError / ValueError like a plain json.loads would; only
+    replies that parse to an `expect` instance are cached. limiter (a
+    RateLimiter) is only waited on when the model is actually called."""
+    key = _cache_key(MODEL, system, prompt, temperature, max_tokens)
+    raw = cache_get(key)
+    if raw is not None:
+        return parse_json_reply(raw)
+    if limiter is not None:
+        limiter.wait()
+    with span("llm.chat"):
+        resp = client.chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "system", "content": system},
+                      {"role": "user", "content": prompt}],
+            max_tokens=max_tokens, temperature=temperature)
+    raw = resp.choices[0].message.content.strip()
+    result = parse_json_reply(raw)
+    if not isinstance(result, expect):
+        raise ValueError(f"Expected JSON {'array' if expect is list else 'object'}")
+    cache_put(key, raw)
+    return result
+
+
+# ── Streaming ───────────────────────────────────────────────────
+
+class JsonArrayWatcher:
+    """Incremental scanner for a streamed JSON object.
+    feed() returns (key, item) for every element of the watched top-level
+    arrays that has closed since the last call, long before the whole
+    document is valid JSON. Text outside the object (e.g. a ```json fence)
+    is ignored."""
+
+    def __init__(self, keys):
+        self.keys = set(keys)
+        self.text = ""
+        self.pos = 0
+        self.stack = []           # open containers, '{' or '['
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None   # most recent string at object depth 1 (a key candidate)
+        self.key = None           # key whose value is being read at depth 1
+        self.watching = None      # watched key whose array is currently open
+        self.item_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        items = []
+        text, i = self.text, self.pos
+        while i < len(text):
+            ch = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if len(self.stack) == 1:
+                        self.last_string = text[self.string_start + 1:i]
+                    elif self.watching and len(self.stack) == 2 and self.item_start == self.string_start:
+                        items.append((self.watching, json.loads(text[self.item_start:i + 1])))
+                        self.item_start = None
+            elif ch == '"':
+                self.in_string = True
+                self.string_start = i
+                if self.watching and len(self.stack) == 2 and self.item_start is None:
+                    self.item_start = i
+            elif ch in "{[":
+                if self.watching and len(self.stack) == 2 and self.item_start is None:
+                    self.item_start = i
+                self.stack.append(ch)
+                if ch == "[" and len(self.stack) == 2 and self.key in self.keys:
+                    self.watching = self.key
+            elif ch in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if self.watching and len(self.stack) == 2 and self.item_start is not None:
+                    items.append((self.watching, json.loads(text[self.item_start:i + 1])))
+                    self.item_start = None
+                elif len(self.stack) == 1:
+                    self.watching = None
+            elif len(self.stack) == 1:
+                if ch == ":":
+                    self.key = self.last_string
+                elif ch == ",":
+                    self.key = None
+            i += 1
+        self.pos = i
+        return items
+
+
+def stream_json(client, system, prompt, max_tokens, temperature, watch=()):
+    """Streaming counterpart of chat_json.
+    Yields ("item", key, value) for each element of the `watch` arrays as soon
+    as the model finishes it, then ("result", None, parsed_reply). Shares the
+    response cache with chat_json; a cache hit replays the items instantly."""
+    key = _cache_key(MODEL, system, prompt, temperature, max_tokens)
+    raw = cache_get(key)
+    if raw is None:
+        watcher = JsonArrayWatcher(watch)
+        parts = []
+        # Covers the whole stream, including time the consumer spends per item.
+        with span("llm.stream"):
+            stream = client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "system", "content": system},
+                          {"role": "user", "content": prompt}],
+                max_tokens=max_tokens, temperature=temperature, stream=True)
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                for name, item in watcher.feed(delta):
+                    yield "item", name, item
+        raw = "".join(parts).strip()
+        result = parse_json_reply(raw)
+        if not isinstance(result, dict):
+            raise ValueError("Expected JSON object")
+        cache_put(key, raw)
+    else:
+        result = parse_json_reply(raw)
+        for name in watch:
+            for item in result.get(name) or []:
+                yield "item", name, item
+    yield "result", None, result
+
+
+def sse(event, data):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
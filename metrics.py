@@ -0,0 +1,284 @@
+"""
+Shared request timing and hot-path instrumentation for all apps.
+init_app() records a latency histogram per endpoint; span() / timed() time
+the expensive steps inside a request or job (SQLite connections, text
+extraction, PDF rendering, model calls, purges). Every process, including
+job-pool children, writes a snapshot of its histograms to metrics_snapshots
+every METRICS_FLUSH_SECONDS, so /metrics (Prometheus text format) and the
+per-app admin panels show totals for all gunicorn workers and jobs.
+METRICS_ENABLED=0 turns all of it off: timed() then returns the function
+itself and span() a shared no-op context manager.
+"""
+import os
+import json
+import time
+import uuid
+import bisect
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from functools import wraps
+from time import perf_counter
+
+METRICS_ENABLED         = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRICS_FLUSH_SECONDS   = float(os.environ.get("METRICS_FLUSH_SECONDS", "10"))
+METRICS_RETENTION_HOURS = float(os.environ.get("METRICS_RETENTION_HOURS", "24"))
+# /metrics answers "Authorization: Bearer <METRICS_TOKEN>" (for scrapers) or a
+# browser logged in to any app's admin panel; anyone else gets a 401.
+METRICS_TOKEN           = os.environ.get("METRICS_TOKEN", "")
+
+# Upper bounds in seconds, as in the Prometheus client defaults plus the
+# long tail of model calls and big renders.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_METRIC = "http_request_duration_seconds"
+SPAN_METRIC    = "span_duration_seconds"
+
+log = logging.getLogger(__name__)
+
+_NOOP = nullcontext()
+_lock = threading.Lock()
+_series = {}            # (metric, labels tuple) -> [bucket counts..., +Inf count, sum]
+_process = None         # this process's snapshot key; reset after fork
+_flusher_pid = None
+
+
+def _labels(**kw):
+    return tuple(sorted(kw.items()))
+
+
+def observe(metric, seconds, **labels):
+    """Add one observation to a histogram series."""
+    _observe((metric, _labels(**labels)), seconds)
+
+
+def _observe(key, seconds):
+    i = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        s = _series.get(key)
+        if s is None:
+            s = _series[key] = [0] * (len(BUCKETS) + 2)
+        s[i] += 1
+        s[-1] += seconds
+    if _flusher_pid != os.getpid():
+        _start_flusher()
+
+
+@contextmanager
+def _span(key):
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        _observe(key, perf_counter() - t0)
+
+
+def span(name):
+    """Context manager timing a block as span `name`."""
+    return _span((SPAN_METRIC, (("span", name),))) if METRICS_ENABLED else _NOOP
+
+
+def timed(name):
+    """Decorator timing every call of a function as span `name`."""
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        key = (SPAN_METRIC, (("span", name),))
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _observe(key, perf_counter() - t0)
+        return wrapper
+    return decorate
+
+
+# ── Cross-process snapshots ─────────────────────────────────────
+
+def _snapshot():
+    with _lock:
+        return [[metric, list(labels), list(s)] for (metric, labels), s in _series.items()]
+
+
+def flush():
+    """Write this process's histograms to metrics_snapshots. Does nothing if
+    the database has no such table (a script run before init_db)."""
+    global _process
+    if _process is None or not _process.startswith(f"{os.getpid()}-"):
+        _process = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    from db import get_db
+    conn = get_db()
+    try:
+        conn.execute("INSERT OR REPLACE INTO metrics_snapshots (process, data, updated_at) VALUES (?,?,?)",
+                     (_process, json.dumps(_snapshot()), datetime.utcnow().isoformat()))
+    except sqlite3.OperationalError as e:
+        conn.close()
+        if "no such table" in str(e):
+            return
+        raise
+    conn.commit()
+    conn.close()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            log.exception("metrics: flush failed")
+
+
+def _start_flusher():
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        # A forked child inherits the parent's counts; they are already in
+        # the parent's snapshot.
+        if _flusher_pid is not None:
+            _series.clear()
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def collect():
+    """Histograms summed over every process's latest snapshot (this
+    process's live counts included): {(metric, labels): [counts..., sum]}."""
+    from db import get_db
+    cutoff = (datetime.utcnow() - timedelta(hours=METRICS_RETENTION_HOURS)).isoformat()
+    conn = get_db()
+    conn.execute("DELETE FROM metrics_snapshots WHERE updated_at < ?", (cutoff,))
+    conn.commit()
+    rows = conn.execute("SELECT process, data FROM metrics_snapshots").fetchall()
+    conn.close()
+    snapshots = [json.loads(r["data"]) for r in rows if r["process"] != _process]
+    snapshots.append(_snapshot())
+    totals = {}
+    for snap in snapshots:
+        for metric, labels, s in snap:
+            key = (metric, tuple(tuple(kv) for kv in labels))
+            acc = totals.setdefault(key, [0] * len(s))
+            for i, v in enumerate(s):
+                acc[i] += v
+    return totals
+
+
+# ── Reporting ───────────────────────────────────────────────────
+
+def _quantile(counts, q):
+    """Estimate a quantile from bucket counts by linear interpolation."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank, seen = q * total, 0
+    for i, n in enumerate(counts):
+        if n and seen + n >= rank:
+            lower = BUCKETS[i - 1] if i else 0.0
+            upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+            return lower + (upper - lower) * (rank - seen) / n
+        seen += n
+    return BUCKETS[-1]
+
+
+def _fmt(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def prometheus_text():
+    """All histograms in the Prometheus text exposition format."""
+    lines, totals = [], sorted(collect().items())
+    for metric, help_text in ((REQUEST_METRIC, "Request latency by endpoint."),
+                              (SPAN_METRIC, "Duration of instrumented hot-path steps.")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for (name, labels), s in totals:
+            if name != metric:
+                continue
+            base = ",".join(f'{k}="{v}"' for k, v in labels)
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), s[:-1]):
+                cumulative += n
+                le = bound if bound == "+Inf" else _fmt(bound)
+                lines.append(f'{metric}_bucket{{{base},le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{base}}} {_fmt(s[-1])}")
+            lines.append(f"{metric}_count{{{base}}} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _row(label, s):
+    counts = s[:-1]
+    count = sum(counts)
+    ms = lambda v: None if v is None else round(v * 1000, 1)
+    return {"name": label, "count": count, "mean_ms": ms(s[-1] / count) if count else None,
+            "p50_ms": ms(_quantile(counts, 0.5)), "p95_ms": ms(_quantile(counts, 0.95)),
+            "p99_ms": ms(_quantile(counts, 0.99))}
+
+
+def app_summary(app_name, shared=("db.", "llm.")):
+    """Endpoint and span timings for one app's admin panel. Spans are the
+    app's own (named "<app>.…") plus the shared ones."""
+    if not METRICS_ENABLED:
+        return {"enabled": False, "endpoints": [], "spans": []}
+    endpoints, spans = {}, {}
+    for (metric, labels), s in collect().items():
+        labels = dict(labels)
+        if metric == REQUEST_METRIC and labels.get("app") == app_name:
+            key = f'{labels["method"]} {labels["endpoint"]}'
+            acc = endpoints.setdefault(key, [0] * len(s))
+        elif metric == SPAN_METRIC and labels["span"].startswith((f"{app_name}.",) + tuple(shared)):
+            acc = spans.setdefault(labels["span"], [0] * len(s))
+        else:
+            continue
+        for i, v in enumerate(s):
+            acc[i] += v
+    by_time = lambda rows: sorted(rows, key=lambda r: -(r["mean_ms"] or 0) * r["count"])
+    return {"enabled": True, "retention_hours": METRICS_RETENTION_HOURS,
+            "endpoints": by_time([_row(k, s) for k, s in endpoints.items()]),
+            "spans": by_time([_row(k, s) for k, s in spans.items()])}
+
+
+# ── Flask wiring ────────────────────────────────────────────────
+
+def _authorized():
+    from flask import request, session
+    if METRICS_TOKEN and request.headers.get("Authorization") == f"Bearer {METRICS_TOKEN}":
+        return True
+    # Each app's admin login sets session["<app>_admin"].
+    return any(v is True and k.endswith("_admin") for k, v in session.items())
+
+
+def init_app(app):
+    """Time every request and serve /metrics."""
+    from flask import request, g, Response, abort
+
+    @app.route("/metrics")
+    def metrics():
+        if not METRICS_ENABLED:
+            abort(404)
+        if not _authorized():
+            abort(401)
+        return Response(prometheus_text(), mimetype="text/plain; version=0.0.4")
+
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_t0 = time.perf_counter()
+
+    # Streamed responses (SSE) are timed to the first byte.
+    @app.after_request
+    def _record(response):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is not None and request.endpoint != "metrics":
+            observe(REQUEST_METRIC, time.perf_counter() - t0,
+                    app=request.blueprint or "home", endpoint=request.endpoint or "<unmatched>",
+                    method=request.method, status=f"{response.status_code // 100}xx")
+        return response
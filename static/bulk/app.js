@@ -2,6 +2,7 @@
 let currentBatchId = null;
 let currentBooks = [];
 let editingBookId = null;
+let pendingEdits = {};   // book id -> edited fields, saved together by flushEdits()
 
 function notify(msg, type = 'info', duration = 4000) {
   const n = document.getElementById('notification');
@@ -32,6 +33,7 @@ document.addEventListener('DOMContentLoaded', () => {
 async function generateBatch() {
   const niche = document.getElementById('nicheInput').value.trim();
   if (!niche) { notify('Please enter a niche or topic.', 'error'); return; }
+  if (!await flushEdits(true)) return;
   const count = Math.max(1, Math.min(50, parseInt(document.getElementById('bookCount').value) || 5));
   const batchName = document.getElementById('batchName').value.trim();
   const extraNotes = document.getElementById('extraNotes').value.trim();
@@ -43,18 +45,36 @@ async function generateBatch() {
   document.getElementById('batchResults').classList.add('hidden');
 
   try {
-    const r = await fetch('/bulk/generate', {
+    const r = await fetch('/bulk/generate-stream', {
       method: 'POST',
       headers: {'Content-Type':'application/json'},
       body: JSON.stringify({ niche, count, batch_name: batchName, extra_notes: extraNotes })
     });
-    const d = await r.json();
-    if (!r.ok) { notify(d.error || 'Generation failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; updateGenerateBtn(); return; }
-    currentBatchId = d.batch_id;
-    currentBooks = d.books;
-    renderBooks(d.books, niche, count);
+    if (!r.ok) {
+      const d = await r.json();
+      notify(d.error || 'Generation failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; updateGenerateBtn(); return;
+    }
+    currentBooks = [];
+    let done = null, lastError = null;
+    await readNdjson(r, ev => {
+      if (ev.type === 'batch') {
+        currentBatchId = ev.batch_id;
+      } else if (ev.type === 'book') {
+        currentBooks.push(ev.book);
+        document.getElementById('loadingState').classList.add('hidden');
+        renderBooks(currentBooks, niche, count, currentBooks.length === 1);
+        btn.textContent = `⏳ ${currentBooks.length} / ${count} books...`;
+      } else if (ev.type === 'error') {
+        lastError = ev.error;
+      } else if (ev.type === 'done') {
+        done = ev;
+      }
+    });
     loadBatchesList();
-    notify(`${d.count} books generated!`, 'success');
+    if (!currentBooks.length) notify(lastError || 'Generation failed.', 'error');
+    else if (done && done.count < count) notify(`${done.count} of ${count} books generated.`, 'info');
+    else if (done) notify(`${done.count} books generated!`, 'success');
+    else notify(`Connection lost — ${currentBooks.length} books were saved.`, 'error');
   } catch(e) { notify('Error: ' + e.message, 'error'); }
 
   document.getElementById('loadingState').classList.add('hidden');
@@ -62,8 +82,26 @@ async function generateBatch() {
   updateGenerateBtn();
 }
 
+async function readNdjson(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    let nl;
+    while ((nl = buffered.indexOf('\n')) >= 0) {
+      const line = buffered.slice(0, nl).trim();
+      buffered = buffered.slice(nl + 1);
+      if (line) onEvent(JSON.parse(line));
+    }
+  }
+  if (buffered.trim()) onEvent(JSON.parse(buffered));
+}
+
 // ── Render Books ───────────────────────────────────────────────
-function renderBooks(books, niche, count) {
+function renderBooks(books, niche, count, scroll = true) {
   document.getElementById('batchMeta').textContent = `${books.length} books · Niche: ${niche}`;
   document.getElementById('exportBtn').onclick = () => exportCSV();
 
@@ -82,7 +120,7 @@ function renderBooks(books, niche, count) {
   }).join('');
 
   document.getElementById('batchResults').classList.remove('hidden');
-  document.getElementById('batchResults').scrollIntoView({ behavior: 'smooth' });
+  if (scroll) document.getElementById('batchResults').scrollIntoView({ behavior: 'smooth' });
 }
 
 // ── Edit Drawer ────────────────────────────────────────────────
@@ -108,7 +146,7 @@ function closeDrawer() {
   editingBookId = null;
 }
 
-async function saveBook() {
+function saveBook() {
   if (!editingBookId) return;
   const kws = document.getElementById('editKeywords').value.split(',').map(k=>k.trim()).filter(Boolean);
   const data = {
@@ -121,33 +159,58 @@ async function saveBook() {
     pages:              parseInt(document.getElementById('editPages').value)||120,
     language:           document.getElementById('editLanguage').value,
   };
+  // Update local data; the edit is saved with any others in one request.
+  const idx = currentBooks.findIndex(b => b.id === editingBookId);
+  if (idx >= 0) currentBooks[idx] = { ...currentBooks[idx], ...data };
+  pendingEdits[editingBookId] = { id: editingBookId, ...data };
+  updateSaveEditsBtn();
+  closeDrawer();
+  // Re-render table row
+  const niche = document.getElementById('nicheInput').value.trim() || '';
+  renderBooks(currentBooks, niche, currentBooks.length, false);
+}
+
+function updateSaveEditsBtn() {
+  const n = Object.keys(pendingEdits).length;
+  const btn = document.getElementById('saveEditsBtn');
+  btn.textContent = `💾 Save ${n} edit${n === 1 ? '' : 's'}`;
+  btn.classList.toggle('hidden', n === 0);
+}
+
+async function flushEdits(quiet = false) {
+  const books = Object.values(pendingEdits);
+  if (!books.length) return true;
   try {
-    const r = await fetch(`/bulk/update-book/${editingBookId}`, {
+    const r = await fetch('/bulk/update-books', {
       method: 'POST',
       headers: {'Content-Type':'application/json'},
-      body: JSON.stringify(data)
+      body: JSON.stringify({ books })
     });
     const d = await r.json();
-    if (!r.ok) { notify('Save failed: ' + (d.error||''), 'error'); return; }
-    // Update local data
-    const idx = currentBooks.findIndex(b => b.id === editingBookId);
-    if (idx >= 0) currentBooks[idx] = { ...currentBooks[idx], ...data };
-    closeDrawer();
-    notify('Book updated!', 'success');
-    // Re-render table row
-    const niche = document.getElementById('nicheInput').value.trim() || '';
-    renderBooks(currentBooks, niche, currentBooks.length);
-  } catch(e) { notify('Error: ' + e.message, 'error'); }
+    if (!r.ok) { notify('Save failed: ' + (d.error||''), 'error'); return false; }
+    // Keep anything edited while the request was in flight.
+    for (const b of books) if (pendingEdits[b.id] === b) delete pendingEdits[b.id];
+    updateSaveEditsBtn();
+    if (!quiet) notify(`${d.updated} book${d.updated === 1 ? '' : 's'} saved!`, 'success');
+    return true;
+  } catch(e) { notify('Error: ' + e.message, 'error'); return false; }
 }
 
+window.addEventListener('beforeunload', () => {
+  const books = Object.values(pendingEdits);
+  if (books.length) navigator.sendBeacon('/bulk/update-books', JSON.stringify({ books }));
+});
+
 // ── Export ─────────────────────────────────────────────────────
-function exportCSV() {
+async function exportCSV() {
   if (!currentBatchId) { notify('No batch to export.', 'error'); return; }
+  if (!await flushEdits(true)) return;
   notify('Preparing CSV...', 'info', 2000);
   window.location.href = `/bulk/export-csv/${currentBatchId}`;
 }
 
-function resetBatch() {
+async function resetBatch() {
+  if (!await flushEdits(true)) return;
   currentBatchId = null; currentBooks = [];
   document.getElementById('batchResults').classList.add('hidden');
   document.getElementById('nicheInput').value = '';
@@ -158,6 +221,7 @@ function resetBatch() {
 
 // ── Load Batch ─────────────────────────────────────────────────
 async function loadBatch(batchId) {
+  if (!await flushEdits(true)) return;
   try {
     const r = await fetch(`/bulk/batch/${batchId}`);
     const d = await r.json();
@@ -170,13 +234,19 @@ async function loadBatch(batchId) {
 }
 
 // ── Batches List ───────────────────────────────────────────────
-async function loadBatchesList() {
+let batchesCursor = null;
+async function loadBatchesList(more = false) {
+  // Also used as a DOMContentLoaded handler, so only `true` means "next page".
+  more = more === true;
   try {
-    const r = await fetch('/bulk/batches');
-    const rows = await r.json();
+    const params = new URLSearchParams({ fields: 'id,name,niche,book_count' });
+    if (more && batchesCursor) params.set('cursor', batchesCursor);
+    const r = await fetch('/bulk/batches?' + params);
+    const d = await r.json();
     const list = document.getElementById('batchesList');
-    if (!rows.length) { list.innerHTML = '<p class="empty-state">No batches created yet.</p>'; return; }
-    list.innerHTML = rows.map(b => `
+    list.querySelector('.load-more')?.remove();
+    if (!more && !d.items.length) { list.innerHTML = '<p class="empty-state">No batches created yet.</p>'; return; }
+    const html = d.items.map(b => `
       <div class="history-item" onclick="loadBatch('${b.id}')">
         <div>
           <strong>${escHtml(b.name||b.niche)}</strong>
@@ -184,6 +254,9 @@ async function loadBatchesList() {
         </div>
         <span class="history-date">${(b.created_at||'').slice(0,10)}</span>
       </div>`).join('');
+    if (more) list.insertAdjacentHTML('beforeend', html); else list.innerHTML = html;
+    batchesCursor = d.next_cursor;
+    if (batchesCursor) list.insertAdjacentHTML('beforeend', `<button class="btn-outline load-more" onclick="loadBatchesList(true)">Load more</button>`);
   } catch(e) {}
 }
 
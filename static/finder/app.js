@@ -26,18 +26,39 @@ async function doSearch() {
   document.getElementById('resultsArea').classList.add('hidden');
 
   try {
-    const r = await fetch('/finder/search', {
+    const r = await fetch('/finder/search-stream', {
       method: 'POST',
       headers: {'Content-Type':'application/json'},
       body: JSON.stringify({ topic })
     });
-    const d = await r.json();
-    if (!r.ok) { notify(d.error || 'Research failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; btn.textContent = '🔍 Research Market'; return; }
-    currentSearchId = d.search_id;
-    currentResults = d.results;
-    renderResults(d.results, topic);
-    loadHistory();
-    notify('Market research complete!', 'success');
+    if (!r.ok) {
+      const d = await r.json();
+      notify(d.error || 'Research failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; btn.textContent = '🔍 Research Market'; return;
+    }
+    // Niches and keywords arrive one by one while the model is still writing.
+    const partial = {};
+    let final = null, error = null, shown = false;
+    await readSse(r, (event, data) => {
+      if (event === 'item') {
+        (partial[data.key] = partial[data.key] || []).push(data.value);
+        document.getElementById('loadingState').classList.add('hidden');
+        renderResults(partial, topic, !shown);
+        shown = true;
+      } else if (event === 'result') {
+        final = data;
+      } else if (event === 'error') {
+        error = data.error;
+      }
+    });
+    if (final) {
+      currentSearchId = final.search_id;
+      currentResults = final.results;
+      renderResults(final.results, topic, !shown);
+      loadHistory();
+      notify('Market research complete!', 'success');
+    } else {
+      notify(error || 'Research failed.', 'error');
+    }
   } catch(e) { notify('Error: ' + e.message, 'error'); }
 
   document.getElementById('loadingState').classList.add('hidden');
@@ -45,6 +66,31 @@ async function doSearch() {
   btn.textContent = '🔍 Research Market';
 }
 
+async function readSse(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  const dispatch = block => {
+    let event = 'message', data = '';
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data += line.slice(5).trim();
+    }
+    if (data) onEvent(event, JSON.parse(data));
+  };
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffered.indexOf('\n\n')) >= 0) {
+      dispatch(buffered.slice(0, sep));
+      buffered = buffered.slice(sep + 2);
+    }
+  }
+  if (buffered.trim()) dispatch(buffered);
+}
+
 // Enter key support
 document.addEventListener('DOMContentLoaded', () => {
   const input = document.getElementById('topicInput');
@@ -53,7 +99,7 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 // ── Render ─────────────────────────────────────────────────────
-function renderResults(results, topic) {
+function renderResults(results, topic, scroll = true) {
   document.getElementById('topicDisplay').textContent = `Topic: "${topic}"`;
   const opp = results.overall_opportunity || 'MEDIUM';
   const badge = document.getElementById('opportunityBadge');
@@ -118,7 +164,7 @@ function renderResults(results, topic) {
     <div class="avoid-item">${escHtml(a)}</div>`).join('');
 
   document.getElementById('resultsArea').classList.remove('hidden');
-  document.getElementById('resultsArea').scrollIntoView({ behavior: 'smooth' });
+  if (scroll) document.getElementById('resultsArea').scrollIntoView({ behavior: 'smooth' });
 }
 
 // ── Export ─────────────────────────────────────────────────────
@@ -136,17 +182,25 @@ function resetSearch() {
 }
 
 // ── History ─────────────────────────────────────────────────────
-async function loadHistory() {
+let historyCursor = null;
+async function loadHistory(more = false) {
+  more = more === true;
   try {
-    const r = await fetch('/finder/history');
-    const rows = await r.json();
+    const params = new URLSearchParams({ fields: 'id,seed_topic' });
+    if (more && historyCursor) params.set('cursor', historyCursor);
+    const r = await fetch('/finder/history?' + params);
+    const d = await r.json();
     const list = document.getElementById('historyList');
-    if (!rows.length) { list.innerHTML = '<p class="empty-state">No searches yet.</p>'; return; }
-    list.innerHTML = rows.map(row => `
+    list.querySelector('.load-more')?.remove();
+    if (!more && !d.items.length) { list.innerHTML = '<p class="empty-state">No searches yet.</p>'; return; }
+    const html = d.items.map(row => `
       <div class="history-item" onclick="loadResult('${row.id}')">
         <strong>${escHtml(row.seed_topic)}</strong>
         <span class="history-date">${(row.created_at||'').slice(0,10)}</span>
       </div>`).join('');
+    if (more) list.insertAdjacentHTML('beforeend', html); else list.innerHTML = html;
+    historyCursor = d.next_cursor;
+    if (historyCursor) list.insertAdjacentHTML('beforeend', `<button class="btn-outline load-more" onclick="loadHistory(true)">Load more</button>`);
   } catch(e) {}
 }
 
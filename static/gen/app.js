@@ -120,13 +120,15 @@ async function generatePDF() {
   document.getElementById('resultCard').classList.add('hidden');
 
   try {
-    const r = await fetch('/gen/generate', {
+    const r = await fetch('/gen/jobs', {
       method: 'POST',
       headers: {'Content-Type':'application/json'},
       body: JSON.stringify(body)
     });
     const d = await r.json();
     if (!r.ok) { notify(d.error || 'Generation failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; return; }
+    const status = await waitForJob(d.project_id);
+    if (status !== 'done') { notify(status === 'timeout' ? 'Generation is taking too long. Check History shortly.' : 'Generation failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; loadHistory(); return; }
     currentProjectId = d.project_id;
     const typeLabel = currentType === 'interior' ? 'Interior PDF' : 'Cover PDF';
     document.getElementById('resultDesc').textContent =
@@ -144,6 +146,23 @@ async function generatePDF() {
   document.getElementById('resultCard').scrollIntoView({ behavior: 'smooth' });
 }
 
+// Renders take seconds; past this, stop polling (the job may have been lost).
+const JOB_TIMEOUT_MS = 5 * 60 * 1000;
+
+async function waitForJob(projectId) {
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+  let delay = 500;
+  while (Date.now() < deadline) {
+    const r = await fetch(`/gen/jobs/${projectId}`);
+    const d = await r.json();
+    if (!r.ok) return 'failed';
+    if (d.status === 'done' || d.status === 'failed') return d.status;
+    await new Promise(res => setTimeout(res, delay));
+    delay = Math.min(delay * 1.5, 3000);
+  }
+  return 'timeout';
+}
+
 function downloadProject() {
   if (!currentProjectId) return;
   notify('Downloading...', 'info', 2000);
@@ -161,20 +180,28 @@ function resetGen() {
 }
 
 // ── History ─────────────────────────────────────────────────────
-async function loadHistory() {
+let historyCursor = null;
+async function loadHistory(more = false) {
+  more = more === true;
   try {
-    const r = await fetch('/gen/history');
-    const rows = await r.json();
+    const params = new URLSearchParams({ fields: 'id,title,project_type,template_id,page_count,status' });
+    if (more && historyCursor) params.set('cursor', historyCursor);
+    const r = await fetch('/gen/history?' + params);
+    const d = await r.json();
     const list = document.getElementById('historyList');
-    if (!rows.length) { list.innerHTML = '<p class="empty-state">No generations yet.</p>'; return; }
-    list.innerHTML = rows.map(row => `
-      <div class="history-item" onclick="window.location='/gen/download/${row.id}'">
+    list.querySelector('.load-more')?.remove();
+    if (!more && !d.items.length) { list.innerHTML = '<p class="empty-state">No generations yet.</p>'; return; }
+    const html = d.items.map(row => `
+      <div class="history-item" onclick="${row.status === 'done' ? `window.location='/gen/download/${row.id}'` : ''}">
         <div>
           <strong>${escHtml(row.title || 'Untitled')}</strong>
-          <span class="history-meta"> · ${row.project_type} · ${row.template_id} · ${row.page_count||''} pages</span>
+          <span class="history-meta"> · ${row.project_type} · ${row.template_id} · ${row.page_count||''} pages${row.status !== 'done' ? ' · ' + escHtml(row.status) : ''}</span>
         </div>
         <span class="history-date">${(row.created_at||'').slice(0,10)}</span>
       </div>`).join('');
+    if (more) list.insertAdjacentHTML('beforeend', html); else list.innerHTML = html;
+    historyCursor = d.next_cursor;
+    if (historyCursor) list.insertAdjacentHTML('beforeend', `<button class="btn-outline load-more" onclick="loadHistory(true)">Load more</button>`);
   } catch(e) {}
 }
 
@@ -1,5 +1,6 @@
 /* ── Legal App JS ── */
 let currentDocId = null;
+let currentFile = null;
 let currentAnalysis = null;
 
 // ── Notifications ─────────────────────────────────────────────
@@ -30,64 +31,88 @@ function handleFile(file) {
   if (!allowed.includes(ext)) { notify('Please upload a PDF, DOCX, DOC or TXT file.', 'error'); return; }
   document.getElementById('fileName').textContent = file.name;
   document.getElementById('fileInfo').classList.remove('hidden');
-  uploadFile(file);
+  currentFile = file;
+  currentDocId = null;
+  notify('Document ready. Click "Analyze for Risks" to proceed.', 'success');
 }
 
 function removeFile() {
   document.getElementById('fileInfo').classList.add('hidden');
   document.getElementById('fileName').textContent = '';
   currentDocId = null;
+  currentFile = null;
   fileInput.value = '';
   document.getElementById('analyzeBtn').disabled = false;
   document.getElementById('analyzeBtn').textContent = '🔍 Analyze for Risks';
 }
 
-// ── Upload ─────────────────────────────────────────────────────
-async function uploadFile(file) {
-  const btn = document.getElementById('analyzeBtn');
-  btn.disabled = true;
-  btn.textContent = 'Uploading...';
-  const fd = new FormData();
-  fd.append('file', file);
-  try {
-    const r = await fetch('/legal/upload', { method: 'POST', body: fd });
-    const d = await r.json();
-    if (!r.ok) { notify(d.error || 'Upload failed.', 'error'); btn.disabled = false; btn.innerHTML = '<span class="btn-icon">🔍</span> Analyze for Risks'; return; }
-    currentDocId = d.doc_id;
-    btn.disabled = false;
-    btn.innerHTML = '<span class="btn-icon">🔍</span> Analyze for Risks';
-    notify('Document uploaded. Click "Analyze for Risks" to proceed.', 'success');
-  } catch(e) {
-    notify('Upload error: ' + e.message, 'error');
-    btn.disabled = false;
-    btn.innerHTML = '<span class="btn-icon">🔍</span> Analyze for Risks';
-  }
-}
-
 // ── Analyze ────────────────────────────────────────────────────
+// The upload is queued for extraction and analysis in the background;
+// the page polls its status until the analysis is ready.
+const STATUS_TEXT = {
+  queued:     'Queued for analysis...',
+  extracting: 'Extracting document text...',
+  extracted:  'Waiting for the AI...',
+  analysing:  'Analyzing document with AI...',
+};
+
 async function analyzeDocument() {
-  if (!currentDocId) { notify('Please upload a document first.', 'error'); return; }
+  if (!currentFile && !currentDocId) { notify('Please upload a document first.', 'error'); return; }
   const btn = document.getElementById('analyzeBtn');
+  const loadingText = document.querySelector('#loadingState p');
   btn.disabled = true;
-  btn.textContent = 'Analyzing...';
+  btn.textContent = currentFile ? 'Uploading...' : 'Analyzing...';
   document.getElementById('loadingState').classList.remove('hidden');
   document.getElementById('resultsSection').classList.add('hidden');
   try {
-    const r = await fetch(`/legal/analyze/${currentDocId}`, { method: 'POST' });
-    const d = await r.json();
-    if (!r.ok) { notify(d.error || 'Analysis failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; btn.innerHTML = '<span class="btn-icon">🔍</span> Analyze for Risks'; return; }
+    let d;
+    if (currentFile) {
+      const fd = new FormData();
+      fd.append('file', currentFile);
+      const r = await fetch('/legal/jobs', { method: 'POST', body: fd });
+      d = await r.json();
+      if (!r.ok) throw new Error(d.error || 'Upload failed.');
+      currentDocId = d.doc_id;
+      btn.textContent = 'Analyzing...';
+    }
+    if (!d || d.status !== 'analysed') {
+      d = await waitForAnalysis(currentDocId, status => { loadingText.textContent = STATUS_TEXT[status] || 'Analyzing document with AI...'; });
+    }
+    if (d.status !== 'analysed') throw new Error(d.error || 'Analysis failed.');
+    // Kept until now so that Analyze after a failure uploads the file again.
+    currentFile = null;
     currentAnalysis = d;
     renderResults(d.result);
     loadHistory();
-    notify('Analysis complete!', 'success');
+    notify(d.reused ? 'Loaded the saved analysis of this document.' : 'Analysis complete!', 'success');
   } catch(e) {
-    notify('Analysis error: ' + e.message, 'error');
+    notify(e.message || 'Analysis failed.', 'error');
   }
+  loadingText.textContent = 'Analyzing document with AI...';
   document.getElementById('loadingState').classList.add('hidden');
   btn.disabled = false;
   btn.innerHTML = '<span class="btn-icon">🔍</span> Analyze for Risks';
 }
 
+// Long documents take a few minutes under the model rate limit; past this,
+// stop polling (the job may have been lost).
+const ANALYSIS_TIMEOUT_MS = 10 * 60 * 1000;
+
+async function waitForAnalysis(docId, onStatus) {
+  const deadline = Date.now() + ANALYSIS_TIMEOUT_MS;
+  let delay = 500;
+  while (Date.now() < deadline) {
+    const r = await fetch(`/legal/jobs/${docId}`);
+    const d = await r.json();
+    if (!r.ok) return { status: 'failed', error: d.error };
+    if (d.status === 'analysed' || d.status === 'failed') return d;
+    onStatus(d.status);
+    await new Promise(res => setTimeout(res, delay));
+    delay = Math.min(delay * 1.5, 3000);
+  }
+  return { status: 'timeout', error: 'Analysis is taking too long. Please try again later.' };
+}
+
 // ── Render Results ─────────────────────────────────────────────
 function renderResults(result) {
   const section = document.getElementById('resultsSection');
@@ -143,13 +168,18 @@ function resetAnalysis() {
 }
 
 // ── History ─────────────────────────────────────────────────────
-async function loadHistory() {
+let historyCursor = null;
+async function loadHistory(more = false) {
+  more = more === true;
   try {
-    const r = await fetch('/legal/history');
-    const rows = await r.json();
+    const params = new URLSearchParams({ fields: 'id,original_name,file_type,status,overall_risk' });
+    if (more && historyCursor) params.set('cursor', historyCursor);
+    const r = await fetch('/legal/history?' + params);
+    const d = await r.json();
     const list = document.getElementById('historyList');
-    if (!rows.length) { list.innerHTML = '<p class="empty-state">No documents analyzed yet.</p>'; return; }
-    list.innerHTML = rows.map(row => {
+    list.querySelector('.load-more')?.remove();
+    if (!more && !d.items.length) { list.innerHTML = '<p class="empty-state">No documents analyzed yet.</p>'; return; }
+    const html = d.items.map(row => {
       const risk = row.overall_risk || '—';
       const rClass = ['HIGH','MEDIUM','LOW'].includes(risk) ? risk : '';
       const hasReport = row.status === 'analysed' && row.overall_risk;
@@ -167,6 +197,9 @@ async function loadHistory() {
         </div>
       </div>`;
     }).join('');
+    if (more) list.insertAdjacentHTML('beforeend', html); else list.innerHTML = html;
+    historyCursor = d.next_cursor;
+    if (historyCursor) list.insertAdjacentHTML('beforeend', `<button class="btn-outline load-more" onclick="loadHistory(true)">Load more</button>`);
   } catch(e) { console.error(e); }
 }
 
@@ -28,18 +28,39 @@ async function optimizeMetadata() {
   document.getElementById('resultsArea').classList.add('hidden');
 
   try {
-    const r = await fetch('/optimizer/optimize', {
+    const r = await fetch('/optimizer/optimize-stream', {
       method: 'POST',
       headers: {'Content-Type':'application/json'},
       body: JSON.stringify({ genre, audience, rough_title: roughTitle, keywords: rawKeywords, description_hint: descHint })
     });
-    const d = await r.json();
-    if (!r.ok) { notify(d.error || 'Optimization failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; btn.textContent = '🚀 Optimize My Metadata'; return; }
-    currentProjectId = d.project_id;
-    currentResult = d.result;
-    renderResults(d.result);
-    loadHistory();
-    notify('Metadata optimized successfully!', 'success');
+    if (!r.ok) {
+      const d = await r.json();
+      notify(d.error || 'Optimization failed.', 'error'); document.getElementById('loadingState').classList.add('hidden'); btn.disabled = false; btn.textContent = '🚀 Optimize My Metadata'; return;
+    }
+    // Titles, keywords and bullets arrive one by one while the model is still writing.
+    const partial = {};
+    let final = null, error = null, shown = false;
+    await readSse(r, (event, data) => {
+      if (event === 'item') {
+        (partial[data.key] = partial[data.key] || []).push(data.value);
+        document.getElementById('loadingState').classList.add('hidden');
+        renderResults(partial, !shown);
+        shown = true;
+      } else if (event === 'result') {
+        final = data;
+      } else if (event === 'error') {
+        error = data.error;
+      }
+    });
+    if (final) {
+      currentProjectId = final.project_id;
+      currentResult = final.result;
+      renderResults(final.result, !shown);
+      loadHistory();
+      notify('Metadata optimized successfully!', 'success');
+    } else {
+      notify(error || 'Optimization failed.', 'error');
+    }
   } catch(e) { notify('Error: ' + e.message, 'error'); }
 
   document.getElementById('loadingState').classList.add('hidden');
@@ -47,8 +68,33 @@ async function optimizeMetadata() {
   btn.textContent = '🚀 Optimize My Metadata';
 }
 
+async function readSse(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  const dispatch = block => {
+    let event = 'message', data = '';
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data += line.slice(5).trim();
+    }
+    if (data) onEvent(event, JSON.parse(data));
+  };
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffered.indexOf('\n\n')) >= 0) {
+      dispatch(buffered.slice(0, sep));
+      buffered = buffered.slice(sep + 2);
+    }
+  }
+  if (buffered.trim()) dispatch(buffered);
+}
+
 // ── Render ─────────────────────────────────────────────────────
-function renderResults(result) {
+function renderResults(result, scroll = true) {
   // Titles
   const tl = document.getElementById('titlesList');
   tl.innerHTML = (result.titles || []).map((t, i) => `
@@ -92,7 +138,7 @@ function renderResults(result) {
     <div class="tip-item"><span class="tip-num">${i+1}.</span><span>${escHtml(tip)}</span></div>`).join('');
 
   document.getElementById('resultsArea').classList.remove('hidden');
-  document.getElementById('resultsArea').scrollIntoView({ behavior: 'smooth' });
+  if (scroll) document.getElementById('resultsArea').scrollIntoView({ behavior: 'smooth' });
 }
 
 // ── Copy Helpers ───────────────────────────────────────────────
@@ -156,13 +202,19 @@ function resetForm() {
 }
 
 // ── History ────────────────────────────────────────────────────
-async function loadHistory() {
+let historyCursor = null;
+async function loadHistory(more = false) {
+  // Also used as a DOMContentLoaded handler, so only `true` means "next page".
+  more = more === true;
   try {
-    const r = await fetch('/optimizer/history');
-    const rows = await r.json();
+    const params = new URLSearchParams({ fields: 'id,genre,rough_title' });
+    if (more && historyCursor) params.set('cursor', historyCursor);
+    const r = await fetch('/optimizer/history?' + params);
+    const d = await r.json();
     const list = document.getElementById('historyList');
-    if (!rows.length) { list.innerHTML = '<p class="empty-state">No optimizations yet.</p>'; return; }
-    list.innerHTML = rows.map(row => `
+    list.querySelector('.load-more')?.remove();
+    if (!more && !d.items.length) { list.innerHTML = '<p class="empty-state">No optimizations yet.</p>'; return; }
+    const html = d.items.map(row => `
       <div class="history-item" onclick="loadHistResult('${row.id}')">
         <div>
           <strong>${escHtml(row.rough_title || 'Untitled')}</strong>
@@ -170,6 +222,9 @@ async function loadHistory() {
         </div>
         <span class="history-date">${(row.created_at||'').slice(0,10)}</span>
       </div>`).join('');
+    if (more) list.insertAdjacentHTML('beforeend', html); else list.innerHTML = html;
+    historyCursor = d.next_cursor;
+    if (historyCursor) list.insertAdjacentHTML('beforeend', `<button class="btn-outline load-more" onclick="loadHistory(true)">Load more</button>`);
   } catch(e) {}
 }
 